@@ -0,0 +1,134 @@
+"""
+Headless benchmark: replay a recording through the vision stages and
+print per-stage latency percentiles, throughput and peak RSS as JSON.
+
+    python benchmark.py --source recording.mp4 --stages object,read,who
+"""
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from input.frame_source import open_frame_source
+from processing.preprocess import PreparedFrame
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except Exception:
+            return None
+
+
+def summarize(samples, wall_seconds):
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    if len(ms) == 0:
+        return {"frames": 0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "frames": int(len(ms)),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "mean_ms": round(float(ms.mean()), 2),
+        "fps": round(len(ms) / wall_seconds, 2) if wall_seconds > 0 else None,
+    }
+
+
+def build_stages(names, detector_backend=None):
+    stages = {}
+    components = {}
+    if "object" in names:
+        from processing.object_detection import ObjectDetector
+        components["object"] = ObjectDetector(backend=detector_backend)
+        stages["object"] = components["object"].detect
+    if "read" in names:
+        from processing.ocr import OCRReader
+        components["read"] = OCRReader()
+        stages["read"] = components["read"].read
+    if "who" in names:
+        import os
+        from processing.face_recognition import FaceRecognizer
+        recognizer = FaceRecognizer()
+        recognizer.load_known_faces(os.path.join(os.getcwd(), "known_faces"))
+        stages["who"] = recognizer.recognize_faces
+    return stages, components
+
+
+def run(source, stage_names, max_frames=None, realtime=False, warmup=1, detector_backend=None):
+    t0 = time.perf_counter()
+    stages, components = build_stages(stage_names, detector_backend)
+    startup = time.perf_counter() - t0
+
+    src = open_frame_source(source, realtime=realtime)
+    samples = {name: [] for name in stages}
+    busy = {name: 0.0 for name in stages}
+    frames = 0
+    wall_start = time.perf_counter()
+    try:
+        while max_frames is None or frames < max_frames:
+            try:
+                frame = src.get_frame()
+            except (EOFError, RuntimeError):
+                break
+            # Stages share conversions as in main.py; each is charged to the first stage needing it
+            prepared = PreparedFrame(frame)
+            for name, fn in stages.items():
+                start = time.perf_counter()
+                fn(prepared)
+                elapsed = time.perf_counter() - start
+                if frames >= warmup:
+                    samples[name].append(elapsed)
+                    busy[name] += elapsed
+            frames += 1
+    finally:
+        src.release()
+    wall = time.perf_counter() - wall_start
+
+    report = {
+        "source": source,
+        "frames": frames,
+        "startup_s": round(startup, 3),
+        "wall_s": round(wall, 3),
+        "end_to_end_fps": round(frames / wall, 2) if wall > 0 else None,
+        # per-stage fps is the stage's own throughput, i.e. frames / time spent in it
+        "stages": {name: summarize(samples[name], busy[name]) for name in stages},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if "object" in components:
+        report["detector"] = components["object"].stats()
+    if "read" in components:
+        report["ocr_engine"] = components["read"].engine_stats()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless end-to-end benchmark")
+    parser.add_argument("--source", required=True, help="video file, image directory or camera index")
+    parser.add_argument("--stages", default="object,read,who", help="comma-separated: object,read,who")
+    parser.add_argument("--frames", type=int, default=None, help="stop after this many frames")
+    parser.add_argument("--realtime", action="store_true", help="pace replay at the recording's native FPS")
+    parser.add_argument("--warmup", type=int, default=1, help="frames excluded from the statistics")
+    parser.add_argument("--detector-backend", default=None, help="onnx, ultralytics or auto (default: settings)")
+    parser.add_argument("--output", default=None, help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args.source, [s.strip() for s in args.stages.split(",") if s.strip()],
+                 max_frames=args.frames, realtime=args.realtime, warmup=args.warmup,
+                 detector_backend=args.detector_backend)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
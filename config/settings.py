@@ -6,10 +6,108 @@ MODEL_PATHS = {
 
 THRESHOLDS = {
     "object_conf": 0.5,
-    "face_match": 0.9
+    "face_match": 0.9,              # cosine similarity for FaceDB searches (unit-norm embeddings)
+    "face_match_distance": 0.6,     # dlib Euclidean distance at or below which two encodings are the same person
+    "lbph_max_distance": 85.0,      # LBPH fallback: predictions with a larger distance are "Unknown"
+    "ocr_conf": 60
 }
 
 VOICE = {
     "rate": 160,
     "volume": 1.0
 }
+
+FACE_DB = {
+    # Switch from exact matmul search to the IVF index above this many faces
+    "ann_min_gallery": 5000,
+    "ann_nlist": 64,
+    "ann_nprobe": 8,
+    "top_k": 5,
+    "storage_dtype": "float32",   # "float32" or "int8" (quantized, 4x smaller than float32)
+    "model": "dlib_resnet_128",   # recorded with every embedding
+    "batch_size": 1000,           # rows per transaction in FaceDB.add_faces
+    "gallery_export": "faces_gallery"  # memory-mapped export loaded by FaceRecognizer when present
+}
+
+FACE_TRACKING = {
+    "iou_match": 0.3,          # min IoU to continue an existing track
+    "drift_iou": 0.5,          # re-encode once a track moved this far from where it was identified
+    "identity_ttl": 5.0,       # seconds before a cached identity is re-checked
+    "max_missed_seconds": 1.0  # drop tracks not seen for this long
+}
+
+PREPROCESS = {
+    "face_detect_width": 640   # faces are located on a frame downscaled to this width, encoded at full res
+}
+
+OCR = {
+    "text_regions": True,       # OCR only candidate text regions instead of the whole frame
+    "workers": None,            # process pool size for region OCR (None = CPU count)
+    "min_region_area": 150,
+    "region_padding": 6,
+    "fallback_full_frame": True,   # OCR the whole frame when no region is found
+    "backend": "auto",            # "tesserocr" (persistent engine), "pytesseract" (CLI per call) or "auto"
+    "lang": "eng",
+    "tessdata": None              # tessdata directory for tesserocr, None = library default
+}
+
+DETECTION = {
+    "backend": "auto",   # "onnx" (onnxruntime, no torch), "ultralytics" or "auto"
+    "input_size": 640,
+    "iou": 0.45,
+    "classes": None      # label allow-list, e.g. ["person", "car", "chair"]; None = all classes
+}
+
+MOTION_GATE = {
+    "min_interval": 0.25,            # fastest continuous detection rate (seconds between runs)
+    "max_interval": 3.0,             # run at least this often even in a static scene
+    "motion_threshold": 4.0,         # mean abs thumbnail diff (0-255) below which the scene is static
+    "scene_change_threshold": 30.0,  # diff that forces an immediate run
+    "target_duty": 0.5               # fraction of one core continuous detection may use
+}
+
+NAVIGATION = {
+    "hfov_deg": 60.0,          # camera horizontal field of view, for the pinhole distance estimate
+    "center_fraction": 0.34,   # width of the "center" band as a fraction of the frame
+    "urgent_distance": 1.5,    # metres
+    "urgent_ttc": 2.0,         # seconds to collision
+    "smoothing": 0.6,          # EMA weight on the previous distance/speed
+    "announce_cooldown": 3.0   # seconds before the same obstacle is announced again
+}
+
+SPEECH_CACHE = {
+    "enabled": True,
+    "dir": "audio_cache",   # pre-rendered phrase WAVs, reused across runs
+    "max_items": 512        # clips kept decoded in memory (LRU)
+}
+
+PIPELINE = {
+    "replicas": {"object": 1, "ocr": 1, "faces": 1},  # worker processes per model
+    "slots": 3,                                         # shared-memory frame slots per worker
+    "max_frame_shape": (1080, 1920, 3),                 # largest frame a slot can hold
+    "start_method": "spawn",                            # fork is unsafe with camera/TTS threads running
+    "call_timeout": 30.0,                               # seconds a blocking call waits for its result
+    "max_restarts": 3                                   # times a crashed worker is restarted before it is given up
+}
+
+METRICS = {
+    "jsonl_path": None,              # e.g. "logs/metrics.jsonl"; None = no file export
+    "jsonl_interval": 10.0,          # seconds between snapshots
+    "jsonl_max_bytes": 5 * 1024 * 1024,
+    "jsonl_backups": 3,
+    "prometheus_port": None,         # e.g. 9108 serves http://127.0.0.1:9108/metrics
+    "profile_dir": "profiles",       # cProfile captures (and the PROFILE trigger file)
+    "profile_seconds": 5.0,          # length of one capture
+    "profile_every": None            # seconds between automatic captures; None = on demand only
+}
+
+RESULT_CACHE = {
+    "enabled": True,
+    # Seconds a one-shot command result stays reusable; only the commands listed are cached.
+    # "read" is out of scope on purpose, so repeating it always re-runs OCR: a coarse frame
+    # hash cannot tell "12.50" from "12.80", and reading out stale text is not acceptable
+    "ttl": {"object": 2.0, "who": 3.0},
+    "max_items": 16,     # LRU size per stage
+    "hash_size": 16,     # difference hash of a 16x16 thumbnail = 256 bits
+    "tolerance": 12      # max differing bits (of 256) for two frames to count as the same view
+}
@@ -1,19 +1,350 @@
+import json
+import os
 import sqlite3, numpy as np
+from config.settings import THRESHOLDS, FACE_DB
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class IVFIndex:
+    """
+    Inverted-file index over unit-norm embeddings.
+    Centroids are trained once with a few rounds of spherical k-means;
+    afterwards new rows are only assigned to their nearest list.
+    """
+    def __init__(self, nlist=64, nprobe=8, iterations=10, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+
+    def train(self, matrix):
+        rng = np.random.default_rng(self.seed)
+        nlist = max(1, min(self.nlist, len(matrix)))
+        centroids = matrix[rng.choice(len(matrix), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assign = np.argmax(matrix @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = matrix[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+        self.centroids = centroids
+        self.lists = [[] for _ in range(nlist)]
+        self.add(matrix, 0)
+
+    def add(self, vectors, start_id):
+        assign = np.argmax(vectors @ self.centroids.T, axis=1)
+        for offset, c in enumerate(assign):
+            self.lists[c].append(start_id + offset)
+
+    def candidates(self, query):
+        nprobe = min(self.nprobe, len(self.lists))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        ids = [i for c in probe for i in self.lists[c]]
+        return np.fromiter(ids, dtype=np.int64, count=len(ids))
+
+
+SCHEMA_VERSION = 2
+
+
+def _encode(unit, dtype):
+    """Serialize one unit-norm vector; returns (blob, scale). int8 keeps a per-row scale."""
+    if dtype == "int8":
+        scale = float(np.abs(unit).max()) / 127.0 or 1.0
+        return np.round(unit / scale).astype(np.int8).tobytes(), scale
+    return unit.astype(np.float32).tobytes(), 1.0
+
+
+def _decode(rows):
+    """
+    Decode (dim, dtype, scale, blob) rows into one float32 matrix.
+    Rows are grouped by storage type and each group is decoded with a
+    single frombuffer over the joined blobs rather than row by row.
+    """
+    out = np.empty((len(rows), rows[0][0]), dtype=np.float32)
+    for dtype, np_type in (("float32", np.float32), ("int8", np.int8)):
+        idx = [i for i, row in enumerate(rows) if row[1] == dtype]
+        if not idx:
+            continue
+        block = np.frombuffer(b"".join(rows[i][3] for i in idx), dtype=np_type).reshape(len(idx), -1)
+        if dtype == "int8":
+            # Rounding leaves dequantized rows slightly off unit length, and cosine scores
+            # assume unit rows, so renormalize (which also makes the per-row scale cancel out)
+            block = _normalize(block * np.array([rows[i][2] for i in idx], dtype=np.float32)[:, None])
+        out[idx] = block
+    return out
+
+
+def load_gallery(path):
+    """
+    Open a gallery written by FaceDB.export_gallery without decoding it:
+    returns (names, unit float32 memmap (N, D), norms memmap (N,), meta).
+    """
+    with open(path + ".json") as f:
+        meta = json.load(f)
+    unit = np.load(path + ".npy", mmap_mode="r")
+    norms = np.load(path + ".norms.npy", mmap_mode="r")
+    return meta.pop("names"), unit, norms, meta
+
 
 class FaceDB:
-    def __init__(self, db_path="faces.db"):
-        self.conn = sqlite3.connect(db_path)
-        self.conn.execute("CREATE TABLE IF NOT EXISTS faces (name TEXT, embedding BLOB)")
+    """
+    Face gallery in SQLite (WAL mode). Schema v2 stores one row per
+    embedding (several per person allowed) as float32 or int8 with its
+    original norm, dimension and model; v1 `faces` tables are migrated on
+    open. Search runs on an in-memory matrix of unit-norm float32 rows.
+    """
+    def __init__(self, db_path="faces.db", ann_min_gallery=None, dtype=None, model=None):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.ann_min_gallery = FACE_DB["ann_min_gallery"] if ann_min_gallery is None else ann_min_gallery
+        self.dtype = FACE_DB["storage_dtype"] if dtype is None else dtype
+        if self.dtype not in ("float32", "int8"):
+            raise ValueError(f"unsupported storage dtype {self.dtype!r}")
+        self.model = FACE_DB["model"] if model is None else model
+        self.names = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._size = 0
+        self._person_ids = {}
+        self.index = None
+        self._create_schema()
+        self._load()
+
+    def _create_schema(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS people (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (id INTEGER PRIMARY KEY, "
+                "person_id INTEGER NOT NULL REFERENCES people(id), model TEXT NOT NULL, dim INTEGER NOT NULL, "
+                "dtype TEXT NOT NULL, scale REAL NOT NULL, norm REAL NOT NULL, data BLOB NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_person ON embeddings (person_id)")
+        if version < SCHEMA_VERSION:
+            legacy = self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'faces'").fetchone()
+            if legacy:
+                # v1: (name, float64 bytes) rows; re-store them in the compact format
+                rows = self.conn.execute("SELECT name, embedding FROM faces").fetchall()
+                self._insert([(r[0], np.frombuffer(r[1], dtype=np.float64)) for r in rows])
+                with self.conn:
+                    self.conn.execute("DROP TABLE faces")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        for person_id, name in self.conn.execute("SELECT id, name FROM people"):
+            self._person_ids[name] = person_id
+
+    def _load(self):
+        rows = self.conn.execute(
+            "SELECT p.name, e.dim, e.dtype, e.scale, e.data, e.norm FROM embeddings e "
+            "JOIN people p ON p.id = e.person_id ORDER BY e.id"
+        ).fetchall()
+        if not rows:
+            return
+        self._append([r[0] for r in rows], _decode([r[1:5] for r in rows]),
+                     np.array([r[5] for r in rows], dtype=np.float32), normalized=True)
+
+    @property
+    def matrix(self):
+        """Pre-normalized float32 embeddings, one row per stored face."""
+        return self._matrix[:self._size]
+
+    @property
+    def norms(self):
+        """L2 norm of each embedding as it was enrolled."""
+        return self._norms[:self._size]
+
+    def _append(self, names, embeddings, norms=None, normalized=False):
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if normalized:
+            vectors = embeddings
+        else:
+            norms = np.linalg.norm(embeddings, axis=1)
+            vectors = _normalize(embeddings)
+        start = self._size
+        if start and vectors.shape[1] != self._matrix.shape[1]:
+            raise ValueError(f"embedding dimension {vectors.shape[1]} does not match the gallery ({self._matrix.shape[1]})")
+        needed = start + len(vectors)
+        if self._matrix.shape[0] < needed or self._matrix.shape[1] != vectors.shape[1]:
+            # Grow geometrically so repeated add_face calls stay amortized O(1);
+            # the width only changes while the gallery is still empty
+            capacity = max(needed, 2 * self._matrix.shape[0], 64)
+            grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            grown_norms = np.empty(capacity, dtype=np.float32)
+            if start:
+                grown[:start] = self._matrix[:start]
+                grown_norms[:start] = self._norms[:start]
+            self._matrix = grown
+            self._norms = grown_norms
+        self._matrix[start:needed] = vectors
+        self._norms[start:needed] = norms
+        self._size = needed
+        self.names.extend(names)
+
+        if self.index is not None:
+            self.index.add(vectors, start)
+        elif self.ann_min_gallery and self._size >= self.ann_min_gallery:
+            self.index = IVFIndex(FACE_DB["ann_nlist"], FACE_DB["ann_nprobe"])
+            self.index.train(self.matrix)
+
+    def _insert(self, items, batch_size=None):
+        """Write (name, embedding) pairs in batched transactions; returns (names, raw matrix)."""
+        batch_size = FACE_DB["batch_size"] if batch_size is None else batch_size
+        names = [name for name, _ in items]
+        if not names:
+            return names, np.empty((0, 0), dtype=np.float32)
+        raw = np.stack([np.asarray(e, dtype=np.float32).reshape(-1) for _, e in items])
+        if self._size and raw.shape[1] != self._matrix.shape[1]:
+            raise ValueError(f"embedding dimension {raw.shape[1]} does not match the gallery ({self._matrix.shape[1]})")
+        norms = np.linalg.norm(raw, axis=1)
+        unit = _normalize(raw)
+        dim = raw.shape[1]
+        for lo in range(0, len(names), batch_size):
+            hi = min(lo + batch_size, len(names))
+            with self.conn:
+                new_people = sorted({n for n in names[lo:hi] if n not in self._person_ids})
+                if new_people:
+                    self.conn.executemany("INSERT OR IGNORE INTO people (name) VALUES (?)", [(n,) for n in new_people])
+                    marks = ",".join("?" * len(new_people))
+                    for person_id, name in self.conn.execute(f"SELECT id, name FROM people WHERE name IN ({marks})",
+                                                             new_people):
+                        self._person_ids[name] = person_id
+                rows = []
+                for i in range(lo, hi):
+                    blob, scale = _encode(unit[i], self.dtype)
+                    rows.append((self._person_ids[names[i]], self.model, dim, self.dtype, scale, float(norms[i]), blob))
+                self.conn.executemany(
+                    "INSERT INTO embeddings (person_id, model, dim, dtype, scale, norm, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows)
+        return names, raw
+
+    def add_faces(self, items, batch_size=None):
+        """
+        Enroll many (name, embedding) pairs at once: one transaction per
+        `batch_size` rows and a single in-memory append. A person may be
+        given several embeddings (e.g. different photos).
+        """
+        names, raw = self._insert(list(items), batch_size)
+        if names:
+            self._append(names, raw)
+        return len(names)
 
     def add_face(self, name, embedding):
-        self.conn.execute("INSERT INTO faces VALUES (?, ?)", (name, embedding.tobytes()))
-        self.conn.commit()
+        self.add_faces([(name, embedding)])
+
+    def clear(self):
+        """Remove every person and embedding."""
+        with self.conn:
+            self.conn.execute("DELETE FROM embeddings")
+            self.conn.execute("DELETE FROM people")
+        self.names = []
+        self._size = 0
+        self._person_ids = {}
+        self.index = None
+
+    def people(self):
+        """{name: number of stored embeddings}."""
+        counts = {}
+        for name in self.names:
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def export_gallery(self, path=None):
+        """
+        Write the unit-norm matrix, norms and names as `path`.npy,
+        `path`.norms.npy and `path`.json so FaceRecognizer can memory-map
+        the gallery (see load_gallery) instead of decoding rows.
+        """
+        path = FACE_DB["gallery_export"] if path is None else path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        meta = {"version": SCHEMA_VERSION, "model": self.model, "dim": int(self.matrix.shape[1]) if self._size else 0,
+                "count": self._size, "names": self.names}
+        # Write beside the targets and swap in, so a reader never maps a half-written file
+        for suffix, array in ((".npy", self.matrix), (".norms.npy", self.norms)):
+            tmp = path + suffix + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(array, dtype=np.float32))
+            os.replace(tmp, path + suffix)
+        with open(path + ".json.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".json.tmp", path + ".json")
+        return path
+
+    def find_matches(self, embedding, k=None, threshold=None):
+        """
+        Return up to k (name, similarity) pairs above the threshold, best first.
+        A person with several embeddings is listed once, with their best score.
+        """
+        k = FACE_DB["top_k"] if k is None else k
+        threshold = THRESHOLDS["face_match"] if threshold is None else threshold
+        if self._size == 0 or k <= 0:
+            return []
+        query = _normalize(embedding).reshape(-1)
+        if self.index is not None:
+            ids = self.index.candidates(query)
+            scores = self._matrix[ids] @ query
+        else:
+            ids = None
+            scores = self.matrix @ query
+        above = np.flatnonzero(scores > threshold)
+        matches = []
+        seen = set()
+        for i in above[np.argsort(-scores[above])]:
+            name = self.names[i if ids is None else ids[i]]
+            if name in seen:
+                continue
+            seen.add(name)
+            matches.append((name, float(scores[i])))
+            if len(matches) == k:
+                break
+        return matches
 
     def find_match(self, embedding):
-        cursor = self.conn.execute("SELECT name, embedding FROM faces")
-        for row in cursor:
-            db_name, db_embed = row[0], np.frombuffer(row[1], dtype=np.float64)
-            similarity = np.dot(embedding, db_embed) / (np.linalg.norm(embedding) * np.linalg.norm(db_embed))
-            if similarity > 0.9:
-                return db_name
-        return None
+        matches = self.find_matches(embedding, k=1)
+        return matches[0][0] if matches else None
+
+
+class EncodingCache:
+    """
+    Content-hashed cache of per-image face data stored alongside the gallery.
+    Rows are keyed by (filename, kind) so encodings and LBPH ROIs can coexist.
+    """
+    def __init__(self, db_path="faces.db"):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS encoding_cache "
+            "(filename TEXT, kind TEXT, digest TEXT, data BLOB, PRIMARY KEY (filename, kind))"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def entries(self, kind):
+        """Return {filename: (digest, data)} for one kind."""
+        cursor = self.conn.execute("SELECT filename, digest, data FROM encoding_cache WHERE kind = ?", (kind,))
+        return {row[0]: (row[1], row[2]) for row in cursor}
+
+    def put(self, kind, filename, digest, data):
+        self.conn.execute("INSERT OR REPLACE INTO encoding_cache VALUES (?, ?, ?, ?)", (filename, kind, digest, data))
+
+    def evict(self, kind, filenames):
+        self.conn.executemany("DELETE FROM encoding_cache WHERE kind = ? AND filename = ?",
+                              [(kind, f) for f in filenames])
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM cache_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO cache_meta VALUES (?, ?)", (key, value))
+
+    def commit(self):
+        self.conn.commit()
@@ -0,0 +1,66 @@
+"""
+Bulk enrollment: encode a folder of photos into the face gallery and
+write the memory-mapped export that main.py loads at startup.
+
+    python enroll.py --folder staff_photos --db gallery.db
+
+Photos are either <folder>/<name>.jpg or <folder>/<name>/*.jpg; every
+photo becomes one embedding of that person.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from database.faces_db import FaceDB
+from processing.face_recognition import HAS_FACE_RECOGNITION, encode_face_file
+
+IMAGE_EXTENSIONS = (".jpg", ".png", ".jpeg")
+
+
+def find_photos(folder):
+    """[(name, path)] for flat files and per-person subfolders."""
+    photos = []
+    for entry in sorted(os.listdir(folder)):
+        path = os.path.join(folder, entry)
+        if os.path.isdir(path):
+            photos.extend((entry, os.path.join(path, f)) for f in sorted(os.listdir(path))
+                          if f.lower().endswith(IMAGE_EXTENSIONS))
+        elif entry.lower().endswith(IMAGE_EXTENSIONS):
+            photos.append((os.path.splitext(entry)[0], path))
+    return photos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll a folder of photos into the face gallery")
+    parser.add_argument("--folder", required=True, help="photos as <name>.jpg or <name>/*.jpg")
+    parser.add_argument("--db", default="gallery.db", help="gallery database (created if missing)")
+    parser.add_argument("--dtype", default=None, help="float32 or int8 (default: settings)")
+    parser.add_argument("--export", default=None, help="export path prefix (default: settings)")
+    parser.add_argument("--append", action="store_true", help="keep existing enrollments instead of replacing them")
+    parser.add_argument("--workers", type=int, default=None, help="encoding processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if not HAS_FACE_RECOGNITION:
+        print("Enrollment needs the face_recognition (dlib) package")
+        return
+    photos = find_photos(args.folder)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        encoded = list(pool.map(encode_face_file, [p for _, p in photos], ["encoding"] * len(photos), chunksize=8))
+    items = [(name, np.frombuffer(data, dtype=np.float64)) for (name, _), data in zip(photos, encoded) if data]
+    encode_seconds = time.perf_counter() - start
+
+    db = FaceDB(args.db, dtype=args.dtype)
+    start = time.perf_counter()
+    if not args.append:
+        db.clear()
+    db.add_faces(items)
+    path = db.export_gallery(args.export)
+    print(f"Enrolled {len(items)} of {len(photos)} photos ({len(photos) - len(items)} without a face) "
+          f"for {len(db.people())} people; encode {encode_seconds:.1f}s, store+export {time.perf_counter() - start:.1f}s")
+    print(f"Gallery export: {path}.npy")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,33 @@
 import cv2
+import platform
+import threading
+import time
+from collections import deque
+from utils.metrics import timed
+
+
+class RateMeter:
+    """Exponentially smoothed events-per-second counter."""
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.fps = 0.0
+        self.count = 0
+        self._last = None
+
+    def tick(self, now=None):
+        now = time.time() if now is None else now
+        if self._last is not None and now > self._last:
+            instant = 1.0 / (now - self._last)
+            self.fps = instant if self.fps == 0.0 else (1 - self.alpha) * self.fps + self.alpha * instant
+        self._last = now
+        self.count += 1
+
 
 class Camera:
-    def __init__(self, device_index=0):
+    def __init__(self, device_index=0, threaded=False, buffer_size=4):
         self.cap = None
-        backend = cv2.CAP_DSHOW  # Prefer DirectShow on Windows
+        # DirectShow is the reliable backend on Windows; elsewhere let OpenCV choose (V4L2, AVFoundation...)
+        backend = cv2.CAP_DSHOW if platform.system() == "Windows" else cv2.CAP_ANY
         candidate_indices = [device_index] + [i for i in range(4) if i != device_index]
         for idx in candidate_indices:
             cap = cv2.VideoCapture(idx, backend)
@@ -19,13 +43,96 @@ class Camera:
 
         if self.cap is None:
             raise RuntimeError("Failed to open camera on indices 0-3. Check camera permissions and device index.")
-    
-    def get_frame(self):
-        ret, frame = self.cap.read()
-        if not ret:
-            raise RuntimeError("Failed to grab frame")
+
+        # Threaded capture state: ring of (seq, timestamp, frame), newest last
+        self.threaded = threaded
+        self._buffer = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._last_consumed_seq = 0
+        self._running = False
+        self._thread = None
+        self.capture_rate = RateMeter()
+        self.consume_rate = RateMeter()
+        self.dropped = 0
+        self.read_failures = 0
+        if threaded:
+            self.start()
+
+    def start(self):
+        """Start the background capture thread (idempotent)."""
+        if self._running:
+            return
+        self.threaded = True
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+
+    def _capture_loop(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            now = time.time()
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+            with self._cond:
+                self._seq += 1
+                self.capture_rate.tick(now)
+                self._buffer.append((self._seq, now, frame))
+                self._cond.notify_all()
+
+    def latest(self):
+        """
+        Non-blocking: return (seq, timestamp, frame) for the newest captured
+        frame, or None if nothing has been captured yet. Frames are shared with
+        the ring buffer, so copy before drawing on them if others may read it.
+        """
+        with self._cond:
+            if not self._buffer:
+                return None
+            return self._buffer[-1]
+
+    def frames(self):
+        """Snapshot of the ring buffer, oldest first."""
+        with self._cond:
+            return list(self._buffer)
+
+    @timed("camera_get_frame_seconds")
+    def get_frame(self, timeout=1.0):
+        if not self.threaded:
+            ret, frame = self.cap.read()
+            if not ret:
+                raise RuntimeError("Failed to grab frame")
+            self.consume_rate.tick()
+            return frame
+
+        # Wait for a frame newer than the last one handed out; stale ones are skipped
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._buffer and self._buffer[-1][0] > self._last_consumed_seq,
+                                       timeout):
+                raise RuntimeError("Failed to grab frame")
+            seq, _, frame = self._buffer[-1]
+            # Frames captured since the last hand-out are dropped rather than queued
+            self.dropped += seq - self._last_consumed_seq - 1
+            self._last_consumed_seq = seq
+        self.consume_rate.tick()
         return frame
-    
+
+    def stats(self):
+        return {
+            "capture_fps": round(self.capture_rate.fps, 2),
+            "consume_fps": round(self.consume_rate.fps, 2),
+            "captured": self.capture_rate.count,
+            "consumed": self.consume_rate.count,
+            "dropped": self.dropped,
+            "read_failures": self.read_failures,
+            "buffered": len(self._buffer),
+        }
+
     def release(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
         if self.cap is not None:
             self.cap.release()
@@ -0,0 +1,113 @@
+import os
+from abc import ABC, abstractmethod
+import time
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class FrameSource(ABC):
+    """
+    Replayable stand-in for Camera: same get_frame()/latest()/release() calls.
+    With realtime=True frames are paced at the recording's native FPS,
+    otherwise they are returned as fast as the caller asks for them.
+    """
+    def __init__(self, fps=30.0, realtime=True, loop=False):
+        self.fps = fps
+        self.realtime = realtime
+        self.loop = loop
+        self._seq = 0
+        self._latest = None
+        self._start = None
+
+    @abstractmethod
+    def _read(self):
+        """Return the next frame or None at end of stream."""
+
+    @abstractmethod
+    def _rewind(self):
+        """Restart the stream from its first frame."""
+
+    def get_frame(self):
+        """Next frame, waiting for its playback time when realtime; raises EOFError at the end."""
+        frame = self._read()
+        if frame is None and self.loop:
+            self._rewind()
+            frame = self._read()
+        if frame is None:
+            raise EOFError("End of frame source")
+        if self.realtime and self.fps > 0:
+            if self._start is None:
+                self._start = time.time()
+            delay = self._start + self._seq / self.fps - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        self._seq += 1
+        self._latest = (self._seq, time.time(), frame)
+        return frame
+
+    def latest(self):
+        return self._latest
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.get_frame()
+            except EOFError:
+                return
+
+    def release(self):
+        pass
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, realtime=True, loop=False):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Failed to open video file: {path}")
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        super().__init__(fps=fps, realtime=realtime, loop=loop)
+
+    def _read(self):
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def _rewind(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    def __init__(self, folder_path, fps=30.0, realtime=True, loop=False):
+        super().__init__(fps=fps, realtime=realtime, loop=loop)
+        self.paths = [os.path.join(folder_path, f) for f in sorted(os.listdir(folder_path))
+                      if f.lower().endswith(IMAGE_EXTENSIONS)]
+        if not self.paths:
+            raise RuntimeError(f"No images found in {folder_path}")
+        self._index = 0
+
+    def _read(self):
+        while self._index < len(self.paths):
+            frame = cv2.imread(self.paths[self._index])
+            self._index += 1
+            if frame is not None:
+                return frame
+        return None
+
+    def _rewind(self):
+        self._index = 0
+
+
+def open_frame_source(spec=None, realtime=True, loop=False):
+    """
+    Open a frame source from a CLI-style spec: None or a device index opens
+    the live Camera, a directory replays its images, anything else is a video file.
+    """
+    if spec is None or str(spec).isdigit():
+        from input.camera import Camera
+        return Camera(device_index=int(spec or 0), threaded=True)
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, realtime=realtime, loop=loop)
+    return VideoFileSource(spec, realtime=realtime, loop=loop)
@@ -1,17 +1,100 @@
-import vosk, pyaudio, json
+import vosk, pyaudio, json, time
+from collections import deque
+
+DEFAULT_COMMANDS = ["object", "read", "who", "exit"]
+
 
 class VoiceCommand:
-    def __init__(self, model_path="vosk-model-small-en-us-0.15"):
+    """
+    Keyword spotter over Vosk. The recognizer is restricted to the command
+    words (plus [unk] for everything else) and commands fire on stable
+    partial results instead of waiting for the utterance to finalize.
+    """
+    def __init__(self, model_path="vosk-model-small-en-us-0.15", commands=None, block_size=1600,
+                 stable_partials=2, min_conf=0.6):
+        self.commands = list(commands or DEFAULT_COMMANDS)
+        self.block_size = block_size  # 100 ms at 16 kHz
+        self.stable_partials = stable_partials
+        self.min_conf = min_conf
         self.model = vosk.Model(model_path)
-        self.recognizer = vosk.KaldiRecognizer(self.model, 16000)
+        self._make_recognizer()
         self.mic = pyaudio.PyAudio()
         self.stream = self.mic.open(format=pyaudio.paInt16, channels=1,
-                                    rate=16000, input=True, frames_per_buffer=8192)
+                                    rate=16000, input=True, frames_per_buffer=self.block_size)
         self.stream.start_stream()
+        self._candidate = None
+        self._candidate_count = 0
+        self._onset = None
+        self._fired_in_utterance = False
+        self.latencies = deque(maxlen=100)
+
+    def _make_recognizer(self):
+        grammar = json.dumps(self.commands + ["[unk]"])
+        self.recognizer = vosk.KaldiRecognizer(self.model, 16000, grammar)
+        self.recognizer.SetWords(True)
+
+    def add_command(self, word):
+        """Extend the grammar with another command word."""
+        if word not in self.commands:
+            self.commands.append(word)
+            self._make_recognizer()
+
+    def _keyword(self, text):
+        for word in text.split():
+            if word in self.commands:
+                return word
+        return None
+
+    def _fire(self, command, onset):
+        now = time.time()
+        self.latencies.append(now - (onset or now))
+        return command
 
     def listen(self):
-        data = self.stream.read(4096, exception_on_overflow=False)
+        """
+        Read one audio block and return a command word as soon as it is
+        recognized, or "" if none is ready yet.
+        """
+        data = self.stream.read(self.block_size, exception_on_overflow=False)
         if self.recognizer.AcceptWaveform(data):
             result = json.loads(self.recognizer.Result())
-            return result.get("text", "")
+            fired = self._fired_in_utterance
+            self._candidate, self._candidate_count = None, 0
+            self._fired_in_utterance = False
+            onset, self._onset = self._onset, None
+            if fired:
+                return ""
+            # Final result carries per-word confidence
+            for word in result.get("result", []):
+                if word.get("word") in self.commands and word.get("conf", 0.0) >= self.min_conf:
+                    return self._fire(word["word"], onset)
+            return ""
+
+        partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        if not partial:
+            return ""
+        if self._onset is None:
+            self._onset = time.time()
+        if self._fired_in_utterance:
+            return ""
+        keyword = self._keyword(partial)
+        if keyword is None:
+            return ""
+        if keyword == self._candidate:
+            self._candidate_count += 1
+        else:
+            self._candidate, self._candidate_count = keyword, 1
+        if self._candidate_count >= self.stable_partials:
+            # Ignore the rest of this utterance so the final result does not fire it twice
+            self._fired_in_utterance = True
+            return self._fire(keyword, self._onset)
         return ""
+
+    def stats(self):
+        """Speech-onset to command-dispatch latency over recent commands (ms)."""
+        lat = sorted(self.latencies)
+        return {
+            "commands": len(lat),
+            "onset_to_dispatch_p50_ms": round(lat[len(lat) // 2] * 1000, 1) if lat else 0.0,
+            "onset_to_dispatch_max_ms": round(lat[-1] * 1000, 1) if lat else 0.0,
+        }
@@ -1,97 +1,192 @@
 
-from input.camera import Camera
-from input.microphone import VoiceCommand
-from processing.object_detection import ObjectDetector
-from processing.ocr import OCRReader
-from processing.face_recognition import FaceRecognizer
-from output.speech import speak
+# Heavy backends (Vosk, ONNX/Ultralytics, Tesseract, dlib) are imported inside their
+# loaders below so that the camera and speech come up before they finish loading.
+from input.frame_source import open_frame_source
+from processing.navigation import Navigator
+from processing.pipeline import VisionPipeline
+from processing.preprocess import PreparedFrame
+from processing.result_cache import ResultCache
+from output.overlay import AnnotationStore
+from output.speech import speak, speech_stats, prewarm_phrases, PRIORITY_URGENT, PRIORITY_LOW
+from utils.threading_utils import TaskScheduler
+from utils.motion import MotionGate
+from utils.startup import StartupOrchestrator
+from utils.metrics import REGISTRY, counter, histogram, timer, record_error, JsonlExporter, serve_prometheus, SamplingProfiler
+from config.settings import METRICS, RESULT_CACHE
 import cv2
-import pytesseract
 import os
 import threading
 from queue import Queue
 import time
 import platform
+import argparse
 from collections import deque
-from typing import List, Tuple, Dict
+from typing import Tuple, Dict
 
-# Point pytesseract to your Tesseract installation (OS-aware)
-if platform.system() == "Windows":
-    pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
-else:
+# Everything that parses argv, starts threads or builds the worker pipeline happens in main():
+# with the spawn start method every vision worker re-imports this module.
+args = None
+HEADLESS = False
+
+def parse_args():
+    # Command-line options: replay a recording instead of the webcam, and/or run without a window
+    parser = argparse.ArgumentParser(description="Drishiti Setu assistive vision")
+    parser.add_argument("--source", default=None, help="camera index, video file or image directory")
+    parser.add_argument("--headless", action="store_true", help="do not open a display window")
+    parser.add_argument("--max-speed", action="store_true", help="replay recordings as fast as possible")
+    parser.add_argument("--processes", action="store_true", help="run detection, OCR and face recognition in worker processes")
+    parser.add_argument("--metrics-file", default=METRICS["jsonl_path"], help="append metric snapshots to this rotating JSONL file")
+    parser.add_argument("--metrics-port", type=int, default=METRICS["prometheus_port"], help="serve Prometheus metrics on this local port")
+    return parser.parse_known_args()[0]
+
+def load_camera():
+    return open_frame_source(args.source, realtime=not args.max_speed)
+
+def load_mic():
+    from input.microphone import VoiceCommand
+    return VoiceCommand()
+
+def _tesseract_cmd():
+    # Point pytesseract to your Tesseract installation (OS-aware)
+    if platform.system() == "Windows":
+        return r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
     possible_paths = [
         "/opt/homebrew/bin/tesseract",
         "/usr/local/bin/tesseract",
     ]
     for p in possible_paths:
         if os.path.exists(p):
-            pytesseract.pytesseract.tesseract_cmd = p
-            break
+            return p
+    return None
 
-# Initialize modules
-cam = Camera()
-mic = VoiceCommand()
-detector = ObjectDetector()
-ocr = OCRReader()
-face_recog = FaceRecognizer()
-
-# Load known faces
 face_folder = os.path.join(os.getcwd(), "known_faces")
-face_recog.load_known_faces(face_folder)
+
+# With --processes the models live in worker processes and are reached through stand-ins
+# that expose the same methods (detect / read_with_boxes / update); built in main()
+pipeline = None
+
+def load_detector():
+    if pipeline is not None:
+        return pipeline.client("object")
+    from processing.object_detection import ObjectDetector
+    return ObjectDetector()
+
+def load_ocr():
+    if pipeline is not None:
+        return pipeline.client("ocr")
+    import pytesseract
+    from processing.ocr import OCRReader
+    cmd = _tesseract_cmd()
+    if cmd:
+        pytesseract.pytesseract.tesseract_cmd = cmd
+    return OCRReader()
+
+def load_faces():
+    if pipeline is not None:
+        remote = pipeline.client("faces")
+        return remote, remote
+    from processing.face_recognition import FaceRecognizer, FaceTracker
+    face_recog = FaceRecognizer()
+    # Load known faces, plus the enrolled gallery export if there is one
+    face_recog.load_known_faces(face_folder)
+    face_recog.load_gallery()
+    return face_recog, FaceTracker(face_recog)
+
+def load_phrases(detector, faces):
+    # Pre-render recurring announcements (COCO labels, directions...) so they play from cache
+    prewarm_phrases(detector.names, [f"Person {name}" for name in faces[0].known_face_names])
+
+# Startup orchestrator, built in main()
+startup = None
+
+# Loaded components; None until their loader finishes
+cam = mic = detector = ocr = face_recog = face_tracker = None
+navigator = Navigator()
+
+# Repeating a one-shot command while pointing at the same thing reuses its last result.
+# Only command results are cached: the continuous loop feeds stateful trackers every frame.
+result_caches = {name: ResultCache(name) for name in RESULT_CACHE["ttl"]} if RESULT_CACHE["enabled"] else {}
+
+def _command_result(command, frame, compute):
+    cache = result_caches.get(command)
+    return compute(frame) if cache is None else cache.cached(frame, compute)
+
+def _set_detector(value):
+    global detector
+    detector = value
+
+def _set_ocr(value):
+    global ocr
+    ocr = value
+
+def _set_faces(value):
+    global face_recog, face_tracker
+    face_recog, face_tracker = value
+
+def _start_listening(value):
+    global mic
+    mic = value
+    REGISTRY.add_collector("voice", mic.stats)
+    threading.Thread(target=listen_thread, daemon=True).start()
+
+def build_startup():
+    # Initialize modules concurrently; each command becomes usable as soon as its backend is ready
+    orchestrator = StartupOrchestrator()
+    orchestrator.add("camera", load_camera)
+    orchestrator.add("mic", load_mic)
+    orchestrator.add("detector", load_detector)
+    orchestrator.add("ocr", load_ocr)
+    orchestrator.add("faces", load_faces)
+    orchestrator.add("phrases", load_phrases, after=("detector", "faces"))
+    orchestrator.on_ready("mic", _start_listening)
+    orchestrator.on_ready("detector", _set_detector)
+    orchestrator.on_ready("ocr", _set_ocr)
+    orchestrator.on_ready("faces", _set_faces)
+    return orchestrator
 
 # Command queue
 commands = Queue()
 running = True
 
+# One worker per command kind; a newer command of the same kind replaces a queued one.
+# The scheduler (and its threads) is created in main()
+COMMANDS = ("object", "read", "who", "exit")
+scheduler = None
+# Results older than this (seconds since the frame was grabbed) are dropped instead of spoken
+COMMAND_DEADLINE_SECONDS = {"object": 3.0, "read": 8.0, "who": 5.0}
+
 # Recent announcements to avoid spamming speech
 recent_objects = deque(maxlen=5)
 last_object_announce = 0.0
 OBJECT_DEBOUNCE_SECONDS = 2.0
-DETECTION_INTERVAL_SECONDS = 0.25  # run heavy detection at ~4 FPS
+# Continuous detection skips static scenes and adapts its rate (see MOTION_GATE in settings)
+motion_gate = MotionGate()
 last_detection_time = 0.0
 # Visual marker controls
 MARKER_DEBOUNCE_SECONDS = 1.5
-MAX_ANNOTATIONS_ON_SCREEN = 60
+MAX_ANNOTATIONS_ON_SCREEN = 500
 last_label_marker_time: Dict[str, float] = {}
 
 # Continuous visuals/speech toggles (set both False to show markers only on commands)
 ENABLE_CONTINUOUS_MARKERS = False
 ENABLE_CONTINUOUS_OBJECT_SPEECH = False
+# Announce only urgent obstacles (close or approaching, straight ahead) from continuous detection
+ENABLE_OBSTACLE_WARNINGS = False
+# Continuous "who is around me": tracked faces are announced once per new identity
+ENABLE_CONTINUOUS_FACES = False
+FACE_TRACK_INTERVAL_SECONDS = 0.5
+last_face_track_time = 0.0
+announced_tracks: Dict[int, str] = {}
 
 # Annotations buffer drawn in the main loop
-annotations: List[Dict] = []
-annotations_lock = threading.Lock()
 ANNOTATION_TTL_SECONDS = 2.0
+annotations = AnnotationStore(capacity=MAX_ANNOTATIONS_ON_SCREEN, ttl=ANNOTATION_TTL_SECONDS)
 
 def add_annotation(kind: str, bbox: Tuple[int, int, int, int], caption: str, color: Tuple[int, int, int]):
-    with annotations_lock:
-        annotations.append({
-            "t": time.time(),
-            "kind": kind,
-            "bbox": bbox,
-            "caption": caption,
-            "color": color
-        })
+    annotations.add(kind, bbox, caption, color)
 
 def draw_annotations(frame):
-    now = time.time()
-    with annotations_lock:
-        # filter expired and draw active
-        active = []
-        for ann in annotations:
-            if (now - ann["t"]) <= ANNOTATION_TTL_SECONDS:
-                active.append(ann)
-                x1, y1, x2, y2 = ann["bbox"]
-                color = ann["color"]
-                caption = ann["caption"]
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                cv2.putText(frame, caption, (x1, max(20, y1-10)), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                cv2.circle(frame, (x1, y1), 4, color, -1)
-        # replace with active list only
-        if len(active) > MAX_ANNOTATIONS_ON_SCREEN:
-            active = active[-MAX_ANNOTATIONS_ON_SCREEN:]
-        annotations.clear()
-        annotations.extend(active)
+    annotations.draw(frame)
 
 # Thread to continuously listen to commands
 def listen_thread():
@@ -100,44 +195,94 @@ def listen_thread():
         cmd = mic.listen()
         if cmd:
             print(f"Heard command: {cmd}")
-            commands.put(cmd.lower())
+            commands.put((cmd.lower(), time.time()))
+
+def _is_stale(command, deadline):
+    if deadline is not None and time.time() > deadline:
+        counter("commands_stale_total", command=command).inc()
+        return True
+    return False
+
+def _loading(component, name, what, cue=None):
+    if component is not None:
+        return False
+    # A loader that raised leaves its component None for good; say so instead of "loading"
+    if startup is not None and startup.error(name) is not None:
+        speak(f"{what} is unavailable", on_start=cue)
+    else:
+        speak(f"{what} is still loading", on_start=cue)
+    return True
+
+def _first_audio(command, heard_at):
+    """Speech start callback recording command-heard -> first-audio latency once per command."""
+    started = []
+    def cue():
+        if heard_at is not None and not started:
+            started.append(True)
+            histogram("command_to_audio_seconds", command=command).observe(time.time() - heard_at)
+    return cue
 
-# Start listening thread
-threading.Thread(target=listen_thread, daemon=True).start()
+def process_command(command, frame, heard_at=None, deadline=None):
+    command = command.strip()
+    counter("commands_total", command=command).inc()
+    with timer("command_seconds", command=command):
+        _run_command(command, frame, deadline, _first_audio(command, heard_at))
 
-def process_command(command, frame):
-    if command.strip() == "object":
-        objects = detector.detect(frame)
+def _run_command(command, frame, deadline, cue):
+    if command == "object":
+        if _loading(detector, "detector", "Object detection", cue):
+            return
+        # Direction/distance only: the navigator's tracks belong to the continuous loop
+        objects = navigator.annotate(_command_result(command, frame, detector.detect), frame.shape)
+        if _is_stale(command, deadline):
+            return
         for obj in objects:
             label = obj.get("label", "Unknown")
             bbox = obj.get("bbox", None)
             direction = obj.get("direction", "")
-            speak(f"Object {label} ahead {direction}")
+            speak(f"Object {label} ahead {direction}", on_start=cue)
             if bbox:
                 x1, y1, x2, y2 = bbox
                 add_annotation("object", (x1, y1, x2, y2), f"Object: {label}", (0, 200, 0))
 
-    elif command.strip() == "read":
-        text = ocr.read(frame)
-        speak(text)
-        data = pytesseract.image_to_data(frame, output_type=pytesseract.Output.DICT)
-        n_boxes = len(data['level'])
-        for i in range(n_boxes):
-            x, y, w, h = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
-            add_annotation("text", (x, y, x + w, y + h), "Text", (255, 0, 0))
-
-    elif command.strip() == "who":
-        faces = face_recog.recognize_faces(frame)
+    elif command == "read":
+        if _loading(ocr, "ocr", "Text reading", cue):
+            return
+        result = ocr.read_with_boxes(frame)
+        if _is_stale(command, deadline):
+            return
+        speak(result["text"], on_start=cue)
+        annotations.add_many([("text", word["bbox"], "Text", (255, 0, 0)) for word in result["words"]])
+
+    elif command == "who":
+        if _loading(face_tracker, "faces", "Face recognition", cue):
+            return
+        faces = _command_result(command, frame, face_tracker.update)
+        if _is_stale(command, deadline):
+            return
         for face in faces:
             x1, y1, x2, y2 = face['bbox']
             name = face.get('name', 'Unknown') or 'Unknown'
             add_annotation("person", (x1, y1, x2, y2), f"Person: {name}", (0, 0, 200))
-            speak(f"Person {name}")
+            speak(f"Person {name}", on_start=cue)
 
-    elif command.strip() == "exit":
+    elif command == "exit":
         global running
         running = False
-        speak("Exiting system...")
+        speak("Exiting system...", on_start=cue)
+        print(f"Command queue metrics: {scheduler.metrics()}")
+        print(f"Motion gate: {motion_gate.stats()}")
+        print(f"Speech: {speech_stats()}")
+        if mic is not None:
+            print(f"Voice commands: {mic.stats()}")
+        if pipeline is not None:
+            print(f"Vision workers: {pipeline.stats()}")
+            pipeline.close()
+        print(f"Result caches: { {name: cache.stats() for name, cache in result_caches.items()} }")
+        print(f"Metrics: {REGISTRY.snapshot()}")
+        if jsonl_exporter is not None:
+            jsonl_exporter.close()
+        scheduler.shutdown()
         try:
             cam.release()
         except Exception:
@@ -148,28 +293,73 @@ def process_command(command, frame):
             pass
         return
 
+# Metrics export and on-demand profiling (see METRICS in settings); set up in main()
+jsonl_exporter = None
+profiler = SamplingProfiler()
+
+def start_metrics():
+    global jsonl_exporter
+    REGISTRY.add_collector("speech", speech_stats)
+    REGISTRY.add_collector("motion_gate", motion_gate.stats)
+    for name, cache in result_caches.items():
+        REGISTRY.add_collector(f"result_cache_{name}", cache.stats)
+    if args.metrics_file:
+        jsonl_exporter = JsonlExporter(args.metrics_file)
+    if args.metrics_port:
+        try:
+            serve_prometheus(args.metrics_port)
+            print(f"Metrics at http://127.0.0.1:{args.metrics_port}/metrics")
+        except OSError as e:
+            print(f"Metrics endpoint disabled: {e}")
+    # kill -USR1 <pid>, or create profiles/PROFILE, to capture a profile of the main loop
+    profiler.install_signal()
+
 def main():
-    global last_detection_time, running
+    global last_detection_time, last_face_track_time, running, cam, args, HEADLESS, pipeline, scheduler, startup
+    args = parse_args()
+    HEADLESS = args.headless
+    if args.processes:
+        pipeline = VisionPipeline(options={"ocr": {"tesseract_cmd": _tesseract_cmd()},
+                                           "faces": {"known_faces": face_folder}})
+    scheduler = TaskScheduler(COMMANDS, max_queue=2, coalesce=True)
+    start_metrics()
+    if pipeline is not None:
+        pipeline.start()
+    startup = build_startup()
+    startup.start()
     speak("System ready. Say a command ('object', 'read', 'who', 'exit').")
+    # Only the camera is needed to start the loop; the rest is picked up as it loads
+    try:
+        cam = startup.get("camera")
+    except RuntimeError as e:
+        print(e)
+        return
+    if hasattr(cam, "stats"):
+        REGISTRY.add_collector("camera", cam.stats)
 
     while running:
         try:
             if not running:
                 break
+            profiler.tick()
+            # Blocks until the next frame (camera) or its playback time (recording), which
+            # also paces the headless loop; raises instead of returning None
             frame = cam.get_frame()
-            if frame is None:
-                if not running:
-                    break
-                continue
+            # Conversions (RGB, gray, downscales, letterbox) are computed once and shared by all stages
+            prepared = PreparedFrame(frame)
 
             # Optional continuous detection/markers and object speech (disabled by default)
-            if ENABLE_CONTINUOUS_MARKERS or ENABLE_CONTINUOUS_OBJECT_SPEECH:
+            if detector is not None and (ENABLE_CONTINUOUS_MARKERS or ENABLE_CONTINUOUS_OBJECT_SPEECH or ENABLE_OBSTACLE_WARNINGS):
                 try:
                     now = time.time()
-                    if (now - last_detection_time) >= DETECTION_INTERVAL_SECONDS:
-                        objects = detector.detect(frame)
-                        # cache detection time
+                    if motion_gate.should_run(frame, now):
+                        objects = navigator.update(detector.detect(prepared), frame.shape)
+                        # cache detection time and feed the inference cost back into the rate
                         last_detection_time = now
+                        motion_gate.record_inference(time.time() - now)
+                        if ENABLE_OBSTACLE_WARNINGS:
+                            for obj in navigator.hazards(objects, now):
+                                speak(navigator.describe(obj), PRIORITY_URGENT)
                         if ENABLE_CONTINUOUS_MARKERS:
                             # render markers (debounced per label)
                             for obj in objects:
@@ -183,17 +373,42 @@ def main():
                             # Debounced TTS for objects
                             global last_object_announce
                             if objects and (now - last_object_announce) > OBJECT_DEBOUNCE_SECONDS:
-                                speak(", ".join(sorted({obj.get('label','Unknown') for obj in objects})))
+                                speak(", ".join(sorted({obj.get('label','Unknown') for obj in objects})), PRIORITY_LOW)
                                 last_object_announce = now
-                except Exception:
-                    pass
+                except Exception as e:
+                    record_error("continuous_detection", e)
+
+            if ENABLE_CONTINUOUS_FACES and face_tracker is not None:
+                try:
+                    now = time.time()
+                    if (now - last_face_track_time) >= FACE_TRACK_INTERVAL_SECONDS:
+                        last_face_track_time = now
+                        for face in face_tracker.update(prepared, now):
+                            name = face.get('name', 'Unknown') or 'Unknown'
+                            if announced_tracks.get(face['track_id']) != name:
+                                announced_tracks[face['track_id']] = name
+                                x1, y1, x2, y2 = face['bbox']
+                                add_annotation("person", (x1, y1, x2, y2), f"Person: {name}", (0, 0, 200))
+                                speak(f"Person {name}")
+                except Exception as e:
+                    record_error("continuous_faces", e)
 
             # Process command if any (for OCR and faces and explicit queries)
             if not commands.empty():
-                command = commands.get()
-                threading.Thread(target=process_command, args=(command, frame.copy()), daemon=True).start()
+                command, heard_at = commands.get()
+                command = command.strip()
+                timeout = COMMAND_DEADLINE_SECONDS.get(command)
+                deadline = time.time() + timeout if timeout else None
+                # The scheduler drops the task if it expires in the queue and passes
+                # the deadline on, so process_command can skip a late announcement
+                if scheduler.submit(command, process_command, command, prepared.detached(), heard_at,
+                                    deadline=deadline) is None:
+                    print(f"Unknown command: {command}")
 
             # Always show live feed with markers
+            if HEADLESS:
+                # No window to service; the next get_frame() call does the waiting
+                continue
             draw_annotations(frame)
             cv2.imshow("Drishiti Setu - Live Feed", frame)
             if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -209,13 +424,18 @@ def main():
                     pass
                 break
 
+        except EOFError:
+            print("End of recording")
+            running = False
+            break
         except RuntimeError:
             if not running:
                 break
+            counter("camera_grab_failures_total").inc()
             print("Failed to grab frame")
             time.sleep(0.1)
         except Exception as e:
-            print(f"Error: {e}")
+            record_error("main_loop", e)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,142 @@
+import heapq
+import threading
+import time
+import cv2
+import numpy as np
+
+
+class AnnotationStore:
+    """
+    Fixed-capacity annotation table backed by preallocated NumPy arrays.
+    Expiry is driven by a heap, so a frame with nothing expiring costs one
+    comparison. Drawing goes to a cached overlay layer that is composited
+    per frame: new annotations are drawn onto it as they arrive, and it is
+    only re-rendered from scratch when something is removed.
+    """
+    def __init__(self, capacity=500, ttl=2.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.boxes = np.zeros((capacity, 4), dtype=np.int32)
+        self.colors = np.zeros((capacity, 3), dtype=np.uint8)
+        self.expires = np.zeros(capacity, dtype=np.float64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.generation = np.zeros(capacity, dtype=np.int64)
+        self.captions = [""] * capacity
+        self.kinds = [""] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+        self._heap = []  # (expires_at, slot, generation)
+        self._lock = threading.Lock()
+        self.version = 0
+        # cached overlay layer, the full-frame mask of its drawn pixels and their bounding region
+        self._layer = None
+        self._mask = None
+        self._roi = None
+        self._added = []       # slots inserted since the layer was last drawn
+        self._removed = True   # a slot was freed, so the layer needs a full redraw
+
+    def _evict_one(self):
+        while self._heap:
+            _, slot, gen = heapq.heappop(self._heap)
+            if self.active[slot] and self.generation[slot] == gen:
+                self.active[slot] = False
+                self._free.append(slot)
+                self._removed = True
+                return
+
+    def _insert(self, kind, bbox, caption, color, expires_at):
+        if not self._free:
+            # Full: drop whatever would have expired first
+            self._evict_one()
+        slot = self._free.pop()
+        self.boxes[slot] = bbox
+        self.colors[slot] = color
+        self.expires[slot] = expires_at
+        self.captions[slot] = caption
+        self.kinds[slot] = kind
+        self.active[slot] = True
+        self.generation[slot] += 1
+        self._added.append(slot)
+        heapq.heappush(self._heap, (expires_at, slot, int(self.generation[slot])))
+
+    def add(self, kind, bbox, caption, color, ttl=None):
+        self.add_many([(kind, bbox, caption, color)], ttl)
+
+    def add_many(self, items, ttl=None):
+        """Add (kind, bbox, caption, color) tuples under a single lock acquisition."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            for kind, bbox, caption, color in items:
+                self._insert(kind, bbox, caption, color, expires_at)
+            self.version += 1
+
+    def expire(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            changed = False
+            while self._heap and self._heap[0][0] <= now:
+                _, slot, gen = heapq.heappop(self._heap)
+                if self.active[slot] and self.generation[slot] == gen:
+                    self.active[slot] = False
+                    self._free.append(slot)
+                    changed = True
+            if changed:
+                self._removed = True
+                self.version += 1
+
+    def __len__(self):
+        return int(self.active.sum())
+
+    def _render_layer(self, shape, slots, clear):
+        h, w = shape[:2]
+        if clear:
+            if self._layer is None or self._layer.shape[:2] != (h, w):
+                self._layer = np.zeros((h, w, 3), dtype=np.uint8)
+                self._mask = np.zeros((h, w), dtype=np.uint8)
+            else:
+                self._layer.fill(0)
+                self._mask.fill(0)
+            self._roi = None
+        if not len(slots):
+            return
+        # Extent of everything drawn (box, corner dot and caption), for growing the composited region
+        lo_x, lo_y, hi_x, hi_y = w, h, 0, 0
+        for slot in slots:
+            x1, y1, x2, y2 = (int(v) for v in self.boxes[slot])
+            color = tuple(int(c) for c in self.colors[slot])
+            caption = self.captions[slot]
+            text_y = max(20, y1-10)
+            cv2.rectangle(self._layer, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(self._layer, caption, (x1, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+            cv2.circle(self._layer, (x1, y1), 4, color, -1)
+            # The same shapes in the mask, so no pixels have to be rescanned
+            cv2.rectangle(self._mask, (x1, y1), (x2, y2), 255, 2)
+            cv2.putText(self._mask, caption, (x1, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.7, 255, 2)
+            cv2.circle(self._mask, (x1, y1), 4, 255, -1)
+            (text_w, text_h), baseline = cv2.getTextSize(caption, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+            lo_x = min(lo_x, x1 - 5, x2 - 2)
+            lo_y = min(lo_y, y1 - 5, y2 - 2, text_y - text_h - 2)
+            hi_x = max(hi_x, x2 + 2, x1 + text_w + 2)
+            hi_y = max(hi_y, y2 + 2, y1 + 5, text_y + baseline + 2)
+        x1, y1 = max(0, lo_x), max(0, lo_y)
+        x2, y2 = min(w, hi_x + 1), min(h, hi_y + 1)
+        if self._roi is not None:
+            rx1, ry1, rx2, ry2 = self._roi
+            x1, y1, x2, y2 = min(x1, rx1), min(y1, ry1), max(x2, rx2), max(y2, ry2)
+        self._roi = (x1, y1, x2, y2)
+
+    def draw(self, frame, now=None):
+        """Expire old annotations and composite the overlay onto frame in place."""
+        self.expire(now)
+        with self._lock:
+            if self._removed or self._layer is None or self._layer.shape[:2] != frame.shape[:2]:
+                self._render_layer(frame.shape, np.flatnonzero(self.active), clear=True)
+            elif self._added:
+                # Additions only: draw just the new annotations over the existing layer
+                self._render_layer(frame.shape, [slot for slot in self._added if self.active[slot]], clear=False)
+            self._added = []
+            self._removed = False
+            if self._roi is None:
+                return frame
+            x1, y1, x2, y2 = self._roi
+            cv2.copyTo(self._layer[y1:y2, x1:x2], self._mask[y1:y2, x1:x2], frame[y1:y2, x1:x2])
+        return frame
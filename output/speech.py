@@ -1,125 +1,661 @@
 import pyttsx3
 import threading
-from queue import Queue
-from config.settings import VOICE
+import heapq
+import itertools
+import hashlib
+import json
+import os
+import re
+import sys
+import wave
+from collections import deque, OrderedDict
+from config.settings import VOICE, SPEECH_CACHE
+from utils.metrics import histogram, gauge
 import platform
 import time
 import subprocess
 
-_tts_queue: "Queue[str]" = Queue()
-_tts_thread_started = False
-_lock = threading.Lock()
-_last_spoken_text = ""
-_last_spoken_time = 0.0
-_speak_cooldown_seconds = 1.0
-
-def _tts_worker():
-    engine = None
-    while True:
-        text = _tts_queue.get()
-        try:
-            if not text or not str(text).strip():
-                continue
+# Lower value = more important. Urgent messages interrupt anything less urgent.
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
 
-            system_name = platform.system()
-            if system_name == "Windows":
-                # Prefer Windows .NET System.Speech via PowerShell for reliability
-                try:
-                    safe_text = text.replace("'", "`'")
-                    rate = int(VOICE.get("rate", 160))
-                    volume = int(float(VOICE.get("volume", 1.0)) * 100)
-                    ps_cmd = (
-                        "Add-Type -AssemblyName System.Speech; "
-                        "$s = New-Object System.Speech.Synthesis.SpeechSynthesizer; "
-                        f"$s.Rate = {max(-10, min(10, (rate-160)//20))}; " ""
-                        f"$s.Volume = {max(0, min(100, volume))}; "
-                        f"$s.Speak('{safe_text}')"
-                    )
-                    subprocess.run(["powershell", "-NoProfile", "-Command", ps_cmd], check=True)
-                    print("Speak done via System.Speech")
-                    continue
-                except Exception:
-                    # Fallback to pyttsx3 if PowerShell path fails
-                    driver_name = 'sapi5'
-                    engine = pyttsx3.init(driverName=driver_name)
-                    engine.setProperty('rate', VOICE.get("rate", 160))
-                    engine.setProperty('volume', VOICE.get("volume", 1.0))
-            else:
-                # Lazily initialize once for non-Windows
-                if engine is None:
-                    driver_name = 'nsss' if system_name == 'Darwin' else None
-                    engine = pyttsx3.init(driverName=driver_name)
-                    engine.setProperty('rate', VOICE.get("rate", 160))
-                    engine.setProperty('volume', VOICE.get("volume", 1.0))
-
-            print(f"Speak: {text}")
+# Seconds a queued message stays worth saying; None = never expires
+DEFAULT_MAX_AGE = {PRIORITY_URGENT: None, PRIORITY_NORMAL: 10.0, PRIORITY_LOW: 5.0}
+
+_speak_cooldown_seconds = 1.0  # same text inside this window is dropped
+_DEFAULT_AGE = object()
+
+
+class Message:
+    __slots__ = ("text", "priority", "enqueued_at", "expires_at", "started_at", "on_start", "interrupted")
+
+    def __init__(self, text, priority, max_age, on_start=None):
+        self.text = text
+        self.priority = priority
+        self.enqueued_at = time.time()
+        self.expires_at = None if max_age is None else self.enqueued_at + max_age
+        self.started_at = None
+        self.on_start = on_start
+        self.interrupted = False
+
+
+def _voice_rate_volume():
+    return int(VOICE.get("rate", 160)), float(VOICE.get("volume", 1.0))
+
+
+def _system_speech_rate_volume():
+    """VOICE rate/volume in System.Speech units (Rate -10..10, Volume 0..100)."""
+    rate, volume = _voice_rate_volume()
+    return max(-10, min(10, (rate - 160) // 20)), max(0, min(100, int(volume * 100)))
+
+
+class PowerShellSynth:
+    """
+    One long-lived PowerShell process holding a System.Speech synthesizer.
+    Lines written to stdin are spoken asynchronously; it answers 'start' and
+    'done' per line. Interrupting sends a cancel line, which stops the
+    current utterance (SpeakAsyncCancelAll) but keeps the process warm.
+    """
+    CANCEL = "\x18"
+    SCRIPT = (
+        "Add-Type -AssemblyName System.Speech; "
+        "$s = New-Object System.Speech.Synthesis.SpeechSynthesizer; "
+        "$s.Rate = {rate}; $s.Volume = {volume}; "
+        "$p = $null; $read = [Console]::In.ReadLineAsync(); "
+        "while ($true) {{ "
+        "if ($read.Wait(20)) {{ "
+        "$line = $read.Result; if ($line -eq $null) {{ break }}; "
+        "if ($line -eq [char]0x18) {{ $s.SpeakAsyncCancelAll() }} "
+        "else {{ $p = $s.SpeakAsync($line); [Console]::Out.WriteLine('start'); [Console]::Out.Flush() }}; "
+        "$read = [Console]::In.ReadLineAsync() }}; "
+        "if ($p -ne $null -and $p.IsCompleted) {{ "
+        "$p = $null; [Console]::Out.WriteLine('done'); [Console]::Out.Flush() }} }}"
+    )
+
+    def __init__(self):
+        self.proc = None
+        # speak() and interrupt() write from different threads
+        self._write_lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        rate, volume = _system_speech_rate_volume()
+        script = self.SCRIPT.format(rate=rate, volume=volume)
+        self.proc = subprocess.Popen(["powershell", "-NoProfile", "-Command", script],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     text=True, bufsize=1)
+
+    def speak(self, text, on_start):
+        if self.proc is None or self.proc.poll() is not None:
+            self._start()
+        proc = self.proc
+        self._send(proc, " ".join(str(text).replace(self.CANCEL, " ").split()))
+        while True:
+            line = proc.stdout.readline()
+            if not line:
+                # process died
+                return
+            if line.strip() == "start":
+                on_start()
+            elif line.strip() == "done":
+                return
+
+    def _send(self, proc, line):
+        with self._write_lock:
+            proc.stdin.write(line + "\n")
+            proc.stdin.flush()
+
+    def interrupt(self):
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
             try:
-                engine.stop()
-            except Exception:
+                self._send(proc, self.CANCEL)
+            except OSError:
                 pass
+
+
+class Pyttsx3Synth:
+    """
+    pyttsx3 engine created once and reused for every utterance. The engine
+    is only touched from the thread running speak(): interrupt() sets a flag
+    that the word callback acts on, so stop() runs inside the engine's loop.
+    """
+    def __init__(self):
+        system_name = platform.system()
+        self.driver_name = 'sapi5' if system_name == 'Windows' else ('nsss' if system_name == 'Darwin' else None)
+        self._on_start = None
+        self._stop = threading.Event()
+        self._init_engine()
+
+    def _init_engine(self):
+        rate, volume = _voice_rate_volume()
+        self.engine = pyttsx3.init(driverName=self.driver_name)
+        self.engine.setProperty('rate', rate)
+        self.engine.setProperty('volume', volume)
+        self.engine.connect('started-utterance', lambda name: self._on_start and self._on_start())
+        self.engine.connect('started-word', self._on_word)
+        if platform.system() == 'Windows':
             try:
-                engine.say(text)
-                engine.runAndWait()
+                voices = self.engine.getProperty('voices')
+                preferred_voice_id = None
+                for v in voices:
+                    name = getattr(v, 'name', '') or ''
+                    id_ = getattr(v, 'id', '') or ''
+                    if 'Zira' in name or 'Zira' in id_:
+                        preferred_voice_id = v.id
+                        break
+                    if 'David' in name or 'David' in id_:
+                        preferred_voice_id = v.id
+                if preferred_voice_id:
+                    self.engine.setProperty('voice', preferred_voice_id)
             except Exception:
-                # Attempt one-time reinitialization and retry
+                pass
+
+    def _on_word(self, name, location, length):
+        if self._stop.is_set():
+            self.engine.stop()
+
+    def speak(self, text, on_start):
+        self._on_start = on_start
+        try:
+            self.engine.say(text)
+            self.engine.runAndWait()
+        except Exception:
+            if self._stop.is_set():
+                return
+            # Attempt one-time reinitialization and retry
+            self._init_engine()
+            self.engine.say(text)
+            self.engine.runAndWait()
+        finally:
+            # Cleared afterwards, not before, so an interrupt sent as speech starts is not lost
+            self._stop.clear()
+
+    def interrupt(self):
+        self._stop.set()
+
+
+class SaySynth:
+    """macOS `say` command, used when pyttsx3 is unavailable."""
+    def __init__(self):
+        self.proc = None
+
+    def speak(self, text, on_start):
+        self.proc = subprocess.Popen(['say', text])
+        on_start()
+        self.proc.wait()
+
+    def interrupt(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+
+
+class Clip:
+    __slots__ = ("pcm", "rate", "width", "channels")
+
+    def __init__(self, pcm, rate, width, channels):
+        self.pcm = pcm
+        self.rate = rate
+        self.width = width
+        self.channels = channels
+
+    @property
+    def format(self):
+        return (self.rate, self.width, self.channels)
+
+
+# Characters whose loss would change what is said ("5%", "$3", "-2", "1/2"); text
+# containing them is never served from the cache
+_MEANINGFUL_CHARS = re.compile(r"[^a-z0-9'\s.,!?;:\"()\-]|-\d")
+# Numbers keep their separators ("1.5", "3:30", "1,000") so they are never split into digits
+_TOKEN = re.compile(r"\d+(?:[.,:]\d+)*|[a-z0-9']+")
+_ONE_DECIMAL = re.compile(r"(\d+)\.(\d)")
+
+
+def _normalize_phrase(text):
+    """
+    Lower-case words only, so "Object person ahead left" and "object person,
+    ahead left" share audio. One-decimal numbers become "<int> point <digit>"
+    so spoken distances compose from cached words; other numbers with
+    separators stay whole tokens. Returns "" for text that must not be cached.
+    """
+    text = str(text).lower()
+    if _MEANINGFUL_CHARS.search(text):
+        return ""
+    words = []
+    for token in _TOKEN.findall(text):
+        decimal = _ONE_DECIMAL.fullmatch(token)
+        words.extend((decimal.group(1), "point", decimal.group(2)) if decimal else (token,))
+    return " ".join(words)
+
+
+# Renderers read "<wav path>\t<phrase>" lines on stdin and echo the path once it is written.
+# They run as child processes so they never share a TTS engine with live speech.
+_PYTTSX3_RENDER = """
+import sys, pyttsx3
+engine = pyttsx3.init()
+engine.setProperty('rate', int(sys.argv[1]))
+engine.setProperty('volume', float(sys.argv[2]))
+for line in sys.stdin:
+    path, _, text = line.rstrip('\\n').partition('\\t')
+    engine.save_to_file(text, path)
+    engine.runAndWait()
+    print(path, flush=True)
+"""
+
+_SYSTEM_SPEECH_RENDER = (
+    "Add-Type -AssemblyName System.Speech; "
+    "$s = New-Object System.Speech.Synthesis.SpeechSynthesizer; "
+    "$s.Rate = {rate}; $s.Volume = {volume}; "
+    "while (($line = [Console]::In.ReadLine()) -ne $null) {{ "
+    "$path, $text = $line.Split([char]9, 2); "
+    "$s.SetOutputToWaveFile($path); $s.Speak($text); $s.SetOutputToNull(); "
+    "[Console]::Out.WriteLine($path); [Console]::Out.Flush() }}"
+)
+
+
+def _render_command():
+    """(voice backend, command) for the renderer matching the live synthesizer."""
+    if platform.system() == "Windows":
+        # Live speech uses System.Speech through PowerShell, so cached clips must too
+        rate, volume = _system_speech_rate_volume()
+        return "system.speech", ["powershell", "-NoProfile", "-Command",
+                                 _SYSTEM_SPEECH_RENDER.format(rate=rate, volume=volume)]
+    rate, volume = _voice_rate_volume()
+    return "pyttsx3", [sys.executable, "-c", _PYTTSX3_RENDER, str(rate), str(volume)]
+
+
+class PhraseCache:
+    """
+    Phrase-level PCM cache. Phrases are rendered to WAV once, by a child
+    process using the same voice as live speech, on a background thread;
+    they are kept on disk across runs and in an in-memory LRU. A phrase
+    that is not cached whole is assembled from the longest cached word
+    fragments. Nothing is written to disk until the first render.
+    """
+    MAX_FRAGMENT_WORDS = 4
+    GAP_SECONDS = 0.04
+
+    def __init__(self, cache_dir=None, max_items=None):
+        self.cache_dir = SPEECH_CACHE["dir"] if cache_dir is None else cache_dir
+        self.max_items = SPEECH_CACHE["max_items"] if max_items is None else max_items
+        rate, volume = _voice_rate_volume()
+        self.backend, self._render_cmd = _render_command()
+        self._voice_key = f"{self.backend}|{rate}|{volume}"
+        self._index_path = os.path.join(self.cache_dir, "index.json")
+        # Clips rendered with another voice, rate or volume are not reused
+        try:
+            with open(self._index_path) as f:
+                saved = json.load(f)
+            self.index = dict(saved["phrases"]) if saved.get("voice") == self._voice_key else {}
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            self.index = {}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.pending = deque()
+        self._render_thread = None
+        self.counters = {"hits": 0, "composite_hits": 0, "misses": 0, "rendered": 0, "evicted": 0}
+
+    def _file_for(self, phrase):
+        digest = hashlib.sha1(f"{self._voice_key}|{phrase}".encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, digest + ".wav")
+
+    def _load(self, phrase):
+        """Return a Clip from memory or disk, refreshing its LRU position."""
+        clip = self._memory.get(phrase)
+        if clip is not None:
+            self._memory.move_to_end(phrase)
+            return clip
+        path = self.index.get(phrase)
+        if path is None:
+            return None
+        try:
+            with wave.open(path, "rb") as w:
+                clip = Clip(w.readframes(w.getnframes()), w.getframerate(), w.getsampwidth(), w.getnchannels())
+        except (OSError, wave.Error, EOFError):
+            self.index.pop(phrase, None)
+            return None
+        self._memory[phrase] = clip
+        if len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+            self.counters["evicted"] += 1
+        return clip
+
+    def lookup(self, text):
+        """Clip for the whole phrase, one concatenated from cached fragments, or None."""
+        phrase = _normalize_phrase(text)
+        if not phrase:
+            return None
+        with self._lock:
+            clip = self._load(phrase)
+            if clip is not None:
+                self.counters["hits"] += 1
+                return clip
+            words = phrase.split()
+            parts, i = [], 0
+            while i < len(words):
+                for n in range(min(self.MAX_FRAGMENT_WORDS, len(words) - i), 0, -1):
+                    part = self._load(" ".join(words[i:i + n]))
+                    if part is not None:
+                        parts.append(part)
+                        i += n
+                        break
+                else:
+                    self.counters["misses"] += 1
+                    return None
+            if any(part.format != parts[0].format for part in parts):
+                self.counters["misses"] += 1
+                return None
+            first = parts[0]
+            gap = b"\x00" * int(first.rate * self.GAP_SECONDS) * first.width * first.channels
+            self.counters["composite_hits"] += 1
+            return Clip(gap.join(part.pcm for part in parts), first.rate, first.width, first.channels)
+
+    def prewarm(self, phrases):
+        """Queue phrases for rendering on the background render thread."""
+        with self._lock:
+            for text in phrases:
+                phrase = _normalize_phrase(text)
+                if phrase and phrase not in self.index and phrase not in self.pending:
+                    self.pending.append(phrase)
+            if self.pending and self._render_thread is None:
+                self._render_thread = threading.Thread(target=self._render_loop, daemon=True,
+                                                       name="phrase-render")
+                self._render_thread.start()
+
+    def _render_loop(self):
+        proc = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            proc = subprocess.Popen(self._render_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                    text=True, bufsize=1)
+            while True:
+                with self._lock:
+                    if not self.pending:
+                        self._render_thread = None
+                        with open(self._index_path, "w") as f:
+                            json.dump({"voice": self._voice_key, "phrases": self.index}, f)
+                        return
+                    phrase = self.pending.popleft()
+                path = os.path.abspath(self._file_for(phrase))
+                proc.stdin.write(f"{path}\t{phrase}\n")
+                proc.stdin.flush()
+                if not proc.stdout.readline():
+                    raise RuntimeError(f"renderer exited with code {proc.wait()}")
                 try:
-                    system_name = platform.system()
-                    driver_name = 'sapi5' if system_name == 'Windows' else ('nsss' if system_name == 'Darwin' else None)
-                    engine = pyttsx3.init(driverName=driver_name)
-                    engine.setProperty('rate', VOICE.get("rate", 160))
-                    engine.setProperty('volume', VOICE.get("volume", 1.0))
-                    if system_name == 'Windows':
-                        try:
-                            voices = engine.getProperty('voices')
-                            preferred_voice_id = None
-                            for v in voices:
-                                name = getattr(v, 'name', '') or ''
-                                id_ = getattr(v, 'id', '') or ''
-                                if 'Zira' in name or 'Zira' in id_:
-                                    preferred_voice_id = v.id
-                                    break
-                                if 'David' in name or 'David' in id_:
-                                    preferred_voice_id = v.id
-                            if preferred_voice_id:
-                                engine.setProperty('voice', preferred_voice_id)
-                        except Exception:
-                            pass
-                    engine.say(text)
-                    engine.runAndWait()
-                except Exception:
-                    # bubble up to fallback
-                    raise
+                    with wave.open(path, "rb"):
+                        pass
+                except (OSError, wave.Error, EOFError):
+                    # Driver cannot render to WAV (e.g. AIFF output); the phrase just stays uncached
+                    continue
+                with self._lock:
+                    self.index[phrase] = path
+                    self.counters["rendered"] += 1
         except Exception as e:
-            # Fallback to macOS 'say' if available
-            try:
-                if platform.system() == 'Darwin':
-                    subprocess.run(['say', text])
-            except Exception:
-                pass
-            try:
-                print(f"TTS error: {e}")
-            except Exception:
-                pass
+            print(f"Phrase rendering stopped: {e}")
+            with self._lock:
+                self.pending.clear()
+                self._render_thread = None
         finally:
-            _tts_queue.task_done()
-
-def _ensure_worker():
-    global _tts_thread_started
-    with _lock:
-        if not _tts_thread_started:
-            thread = threading.Thread(target=_tts_worker, daemon=True)
-            thread.start()
-            _tts_thread_started = True
-
-def speak(text: str):
-    _ensure_worker()
-    global _last_spoken_text, _last_spoken_time
-    now = time.time()
-    # Skip if same text repeated too quickly
-    if not text or not str(text).strip():
-        return
-    if text == _last_spoken_text and (now - _last_spoken_time) < _speak_cooldown_seconds:
+            if proc is not None:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+                proc.wait()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["composite_hits"] + self.counters["misses"]
+            hit_rate = (self.counters["hits"] + self.counters["composite_hits"]) / lookups if lookups else 0.0
+            return dict(self.counters, hit_rate=round(hit_rate, 3), cached=len(self.index),
+                        in_memory=len(self._memory), pending=len(self.pending))
+
+
+class AudioPlayer:
+    """Plays cached PCM through a PyAudio stream kept open per audio format."""
+    CHUNK_FRAMES = 1024
+
+    def __init__(self):
+        import pyaudio
+        self._pa = pyaudio.PyAudio()
+        self._streams = {}
+        self._stop = threading.Event()
+
+    def play(self, clip, on_start):
+        stream = self._streams.get(clip.format)
+        if stream is None:
+            stream = self._pa.open(format=self._pa.get_format_from_width(clip.width),
+                                   channels=clip.channels, rate=clip.rate, output=True)
+            self._streams[clip.format] = stream
+        self._stop.clear()
+        step = self.CHUNK_FRAMES * clip.width * clip.channels
+        on_start()
+        for i in range(0, len(clip.pcm), step):
+            if self._stop.is_set():
+                return
+            stream.write(clip.pcm[i:i + step])
+
+    def interrupt(self):
+        self._stop.set()
+
+
+def _create_synth():
+    system_name = platform.system()
+    if system_name == "Windows":
+        # Prefer Windows .NET System.Speech via PowerShell for reliability
+        try:
+            return PowerShellSynth()
+        except Exception:
+            pass
+    try:
+        return Pyttsx3Synth()
+    except Exception:
+        if system_name == 'Darwin':
+            return SaySynth()
+        raise
+
+
+class SpeechScheduler:
+    """
+    Priority speech queue in front of one persistent synthesizer.
+    More urgent messages interrupt the current utterance, expired messages
+    are dropped unspoken, and repeats are suppressed over a time window.
+    """
+    def __init__(self, synth_factory=_create_synth, dedup_window=_speak_cooldown_seconds, phrase_cache=None):
+        self.synth_factory = synth_factory
+        self.dedup_window = dedup_window
+        self.phrase_cache = phrase_cache
+        self._player = None
+        self._output = None
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._recent = {}
+        self._current = None
+        self._synth = None
+        self._thread = None
+        self.latencies = deque(maxlen=200)
+        self.counters = {"queued": 0, "spoken": 0, "deduplicated": 0, "expired": 0, "interrupted": 0, "errors": 0}
+        self._pending_gauge = gauge("speech_pending")
+        self._queue_hist = histogram("speech_queue_seconds")
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, daemon=True)
+            self._thread.start()
+
+    def submit(self, text, priority=PRIORITY_NORMAL, max_age=_DEFAULT_AGE, on_start=None):
+        if not text or not str(text).strip():
+            return False
+        text = str(text)
+        now = time.time()
+        if max_age is _DEFAULT_AGE:
+            max_age = DEFAULT_MAX_AGE.get(priority)
+        with self._cond:
+            self._ensure_worker()
+            # Time-windowed dedup over every recent message, not just the last one
+            for old in [t for t, at in self._recent.items() if now - at >= self.dedup_window]:
+                del self._recent[old]
+            if text in self._recent:
+                self.counters["deduplicated"] += 1
+                return False
+            self._recent[text] = now
+
+            message = Message(text, priority, max_age, on_start)
+            if priority == PRIORITY_URGENT:
+                # Background chatter queued behind a hazard warning is no longer useful
+                dropped = [entry for entry in self._heap if entry[2].priority == PRIORITY_LOW]
+                if dropped:
+                    self._heap = [entry for entry in self._heap if entry[2].priority != PRIORITY_LOW]
+                    heapq.heapify(self._heap)
+                    self.counters["expired"] += len(dropped)
+            heapq.heappush(self._heap, (priority, next(self._seq), message))
+            self.counters["queued"] += 1
+            self._pending_gauge.set(len(self._heap))
+            current = self._current
+            if current is not None and priority < current.priority and self._output is not None \
+                    and not current.interrupted:
+                current.interrupted = True
+                self.counters["interrupted"] += 1
+                self._output.interrupt()
+            self._cond.notify()
+        return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._heap)
+                _, _, message = heapq.heappop(self._heap)
+                self._pending_gauge.set(len(self._heap))
+            with self._cond:
+                if message.expires_at is not None and time.time() > message.expires_at:
+                    self.counters["expired"] += 1
+                    continue
+                self._current = message
+            try:
+                on_start = lambda m=message: self._started(m)
+                clip = self.phrase_cache.lookup(message.text) if self.phrase_cache is not None else None
+                if clip is not None:
+                    try:
+                        if self._player is None:
+                            self._player = AudioPlayer()
+                        print(f"Speak (cached): {message.text}")
+                        self._output = self._player
+                        self._player.play(clip, on_start)
+                    except Exception as e:
+                        # No usable audio output for raw PCM: stop using the cache for playback
+                        print(f"Cached playback failed, using TTS: {e}")
+                        self.phrase_cache = None
+                        clip = None
+                if clip is None:
+                    if self._synth is None:
+                        self._synth = self.synth_factory()
+                    print(f"Speak: {message.text}")
+                    self._output = self._synth
+                    self._synth.speak(message.text, on_start)
+                # Cut-off messages are already counted as interrupted
+                if not message.interrupted:
+                    self.counters["spoken"] += 1
+            except Exception as e:
+                self.counters["errors"] += 1
+                # Fallback to macOS 'say' if available
+                try:
+                    if platform.system() == 'Darwin':
+                        subprocess.run(['say', message.text])
+                except Exception:
+                    pass
+                try:
+                    print(f"TTS error: {e}")
+                except Exception:
+                    pass
+                self._synth = None
+            finally:
+                with self._cond:
+                    self._current = None
+                    self._output = None
+
+    def _started(self, message):
+        if message.started_at is None:
+            message.started_at = time.time()
+            self.latencies.append(message.started_at - message.enqueued_at)
+            self._queue_hist.observe(message.started_at - message.enqueued_at)
+            if message.on_start is not None:
+                try:
+                    message.on_start()
+                except Exception as e:
+                    print(f"Speech start callback failed: {e}")
+
+    def stats(self):
+        """Counters plus enqueue-to-audio latency (ms) over recent messages."""
+        with self._cond:
+            lat = sorted(self.latencies)
+            report = dict(self.counters,
+                          pending=len(self._heap),
+                          latency_p50_ms=round(lat[len(lat) // 2] * 1000, 1) if lat else 0.0,
+                          latency_max_ms=round(lat[-1] * 1000, 1) if lat else 0.0)
+        if self.phrase_cache is not None:
+            report["phrase_cache"] = self.phrase_cache.stats()
+        return report
+
+
+def _create_phrase_cache():
+    if not SPEECH_CACHE["enabled"]:
+        return None
+    try:
+        return PhraseCache()
+    except Exception as e:
+        print(f"Phrase cache disabled: {e}")
+        return None
+
+
+# The phrase cache is attached on first use rather than at import, since vision worker
+# processes import this module too (through main.py) but never speak
+_scheduler = SpeechScheduler()
+_phrase_cache_lock = threading.Lock()
+_phrase_cache_attached = False
+
+
+def _get_scheduler():
+    global _phrase_cache_attached
+    if not _phrase_cache_attached:
+        with _phrase_cache_lock:
+            if not _phrase_cache_attached:
+                _scheduler.phrase_cache = _create_phrase_cache()
+                _phrase_cache_attached = True
+    return _scheduler
+
+# Fixed vocabulary used by the announcements in main.py and navigation
+BASE_PHRASES = [
+    "System ready. Say a command ('object', 'read', 'who', 'exit').",
+    "Exiting system...",
+    "object", "ahead", "person", "unknown", "left", "center", "right",
+    "meters", "approaching", "point", "very close",
+] + [str(n) for n in range(21)]
+
+
+def speak(text: str, priority: int = PRIORITY_NORMAL, max_age=_DEFAULT_AGE, on_start=None):
+    """
+    Queue text for speech. PRIORITY_URGENT interrupts whatever is playing;
+    max_age (seconds) overrides how long the message may wait in the queue.
+    on_start is called (from the speech thread) when its audio begins.
+    """
+    return _get_scheduler().submit(text, priority, max_age, on_start)
+
+
+def speech_stats():
+    return _get_scheduler().stats()
+
+
+def prewarm_phrases(labels=(), phrases=()):
+    """
+    Pre-render the base vocabulary plus detector labels (e.g. ObjectDetector.names)
+    and any extra phrases into the audio cache, in the background.
+    """
+    phrase_cache = _get_scheduler().phrase_cache
+    if phrase_cache is None:
         return
-    _last_spoken_text = text
-    _last_spoken_time = now
-    _tts_queue.put(text)
+    if isinstance(labels, dict):
+        labels = labels.values()
+    phrase_cache.prewarm(list(BASE_PHRASES) + list(labels) + list(phrases))
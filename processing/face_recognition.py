@@ -1,6 +1,16 @@
 import os
+import time
+import hashlib
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 import cv2
 import numpy as np
+from database.faces_db import EncodingCache, load_gallery
+from processing.preprocess import prepare, to_original
+from utils.helpers import iou_matrix
+from utils.metrics import timed
+from config.settings import THRESHOLDS, FACE_TRACKING, PREPROCESS, FACE_DB, PIPELINE
 
 # Try to import the dlib-based face_recognition library.
 # If unavailable (e.g., dlib build issues), fall back to OpenCV-only detection.
@@ -11,11 +21,43 @@ except Exception:
     face_recognition = None
     HAS_FACE_RECOGNITION = False
 
+_worker_cascade = None
+
+def encode_face_file(image_path, kind):
+    """
+    Encode one face image; picklable, so it can run as a process-pool task.
+    Returns the first 128-d encoding (kind "encoding") or stacked 200x200
+    grayscale face ROIs (kind "lbph") as bytes; empty bytes if no face found.
+    """
+    global _worker_cascade
+    if kind == "encoding":
+        image = face_recognition.load_image_file(image_path)
+        encodings = face_recognition.face_encodings(image)
+        return np.asarray(encodings[0], dtype=np.float64).tobytes() if encodings else b""
+
+    if _worker_cascade is None:
+        _worker_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    img = cv2.imread(image_path)
+    if img is None:
+        return b""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    faces = _worker_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(60, 60))
+    rois = [cv2.resize(gray[y:y+h, x:x+w], (200, 200)) for (x, y, w, h) in faces]
+    return np.stack(rois).tobytes() if rois else b""
+
 class FaceRecognizer:
     def __init__(self):
         # These are the attributes used in recognition
         self.known_face_encodings = []
         self.known_face_names = []
+        self._known_matrix = np.empty((0, 128), dtype=np.float64)
+        self._known_unit = np.empty((0, 128), dtype=np.float32)
+        self._known_norms = np.empty(0, dtype=np.float32)
+        self._mapped = None  # (unit, norms, names) memory-mapped from a FaceDB export
+        # Each backend has its own metric, so each has its own limit (see THRESHOLDS)
+        self.match_tolerance = THRESHOLDS["face_match_distance"]
+        self.lbph_max_distance = THRESHOLDS["lbph_max_distance"]
+        self.detect_width = PREPROCESS["face_detect_width"]
         if not HAS_FACE_RECOGNITION:
             # Prepare OpenCV Haar cascade for face detection as a fallback
             cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
@@ -31,91 +73,279 @@ class FaceRecognizer:
             self._lbph_images = []
             self._lbph_labels = []
 
-    def load_known_faces(self, folder_path):
+    def load_known_faces(self, folder_path, cache_path="faces.db", workers=None):
         """
         Load all images from the 'known_faces' folder
         and extract their face encodings.
+        Results are cached in `cache_path` keyed by file content, so only
+        new or changed images are re-encoded; misses run in a process pool.
         """
-        for filename in os.listdir(folder_path):
+        kind = "encoding" if HAS_FACE_RECOGNITION else "lbph"
+        cache = EncodingCache(cache_path)
+        cached = cache.entries(kind)
+
+        files = {}
+        for filename in sorted(os.listdir(folder_path)):
             if filename.endswith((".jpg", ".png", ".jpeg")):
                 image_path = os.path.join(folder_path, filename)
-                name = os.path.splitext(filename)[0]
-                if HAS_FACE_RECOGNITION:
-                    image = face_recognition.load_image_file(image_path)
-                    encodings = face_recognition.face_encodings(image)
-                    if encodings:
-                        self.known_face_encodings.append(encodings[0])
-                        self.known_face_names.append(name)
-                else:
-                    # For LBPH fallback, collect grayscale face regions and labels
-                    if getattr(self, "_haar_cascade", None) is not None:
-                        img = cv2.imread(image_path)
-                        if img is None:
-                            continue
-                        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                        faces = self._haar_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(60, 60))
-                        for (x, y, w, h) in faces:
-                            roi = gray[y:y+h, x:x+w]
-                            roi_resized = cv2.resize(roi, (200, 200))
-                            if name not in self._name_to_label:
-                                self._name_to_label[name] = len(self._label_to_name)
-                                self._label_to_name.append(name)
-                            label_id = self._name_to_label[name]
-                            self._lbph_images.append(roi_resized)
-                            self._lbph_labels.append(label_id)
-
-        # Train LBPH if available and data present
+                with open(image_path, "rb") as f:
+                    files[filename] = (image_path, hashlib.sha1(f.read()).hexdigest())
+
+        stale = [f for f in cached if f not in files]
+        misses = [f for f, (_, digest) in files.items() if cached.get(f, (None,))[0] != digest]
+        if misses:
+            paths = [files[f][0] for f in misses]
+            if len(paths) > 1 and workers != 1:
+                # Loaders run in startup threads next to camera and speech, where fork is unsafe
+                with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context(PIPELINE["start_method"])) as pool:
+                    encoded = list(pool.map(encode_face_file, paths, [kind] * len(paths)))
+            else:
+                encoded = [encode_face_file(p, kind) for p in paths]
+            for filename, data in zip(misses, encoded):
+                cached[filename] = (files[filename][1], data)
+                cache.put(kind, filename, files[filename][1], data)
+        if stale:
+            cache.evict(kind, stale)
+            for filename in stale:
+                del cached[filename]
+
+        for filename in files:
+            name = os.path.splitext(filename)[0]
+            data = cached[filename][1]
+            if not data:
+                continue
+            if HAS_FACE_RECOGNITION:
+                self.known_face_encodings.append(np.frombuffer(data, dtype=np.float64).copy())
+                self.known_face_names.append(name)
+            else:
+                # For LBPH fallback, collect grayscale face regions and labels
+                if name not in self._name_to_label:
+                    self._name_to_label[name] = len(self._label_to_name)
+                    self._label_to_name.append(name)
+                label_id = self._name_to_label[name]
+                for roi_resized in np.frombuffer(data, dtype=np.uint8).reshape(-1, 200, 200):
+                    self._lbph_images.append(roi_resized)
+                    self._lbph_labels.append(label_id)
+
+        # Train LBPH if available and data present, reusing the saved model when the inputs are unchanged
         if not HAS_FACE_RECOGNITION and self._lbph is not None and len(self._lbph_images) > 0:
+            signature = hashlib.sha1("".join(f + d for f, (d, _) in sorted(cached.items())).encode()).hexdigest()
+            model_path = os.path.splitext(cache_path)[0] + "_lbph.yml"
             try:
-                self._lbph.train(self._lbph_images, np.array(self._lbph_labels))
+                if cache.get_meta("lbph_signature") == signature and os.path.exists(model_path):
+                    self._lbph.read(model_path)
+                else:
+                    self._lbph.train(self._lbph_images, np.array(self._lbph_labels))
+                    self._lbph.write(model_path)
+                    cache.set_meta("lbph_signature", signature)
                 self._lbph_trained = True
             except Exception:
                 self._lbph_trained = False
+        cache.commit()
 
+    def known_matrix(self):
+        """
+        Known encodings as one contiguous (N, 128) array, rebuilt only when
+        `known_face_encodings` has changed size.
+        """
+        if len(self._known_matrix) != len(self.known_face_encodings):
+            self._known_matrix = np.ascontiguousarray(self.known_face_encodings, dtype=np.float64).reshape(-1, 128)
+        return self._known_matrix
+
+    def load_gallery(self, path=None):
+        """
+        Memory-map a gallery written by FaceDB.export_gallery. It is searched
+        together with the known_faces folder; rows are read by the matmul
+        on demand, so even a large gallery loads instantly.
+        Returns the number of mapped embeddings (0 if there is no export).
+        """
+        path = FACE_DB["gallery_export"] if path is None else path
+        if not path or not os.path.exists(path + ".json"):
+            return 0
+        if not HAS_FACE_RECOGNITION:
+            print("Face gallery export needs dlib encodings; skipped with the LBPH fallback")
+            return 0
+        names, unit, norms, meta = load_gallery(path)
+        if len(names) and unit.shape[1] != 128:
+            print(f"Face gallery {path} has {unit.shape[1]}-d embeddings ({meta.get('model')}); skipped")
+            return 0
+        self._mapped = (unit, norms, names)
+        return len(names)
+
+    def _galleries(self):
+        """(unit float32 rows, norms, names) for the known faces and any mapped gallery."""
+        if len(self._known_norms) != len(self.known_face_encodings):
+            known = self.known_matrix()
+            norms = np.linalg.norm(known, axis=1)
+            self._known_unit = (known / np.maximum(norms, 1e-12)[:, None]).astype(np.float32)
+            self._known_norms = norms.astype(np.float32)
+        galleries = [(self._known_unit, self._known_norms, self.known_face_names)]
+        if self._mapped is not None:
+            galleries.append(self._mapped)
+        return galleries
+
+    def match_encodings(self, face_encodings):
+        """
+        Match all face encodings of a frame at once: one pairwise Euclidean
+        distance matrix per gallery, then an argmin per face. Distances come
+        from unit rows and stored norms (|a|^2 + |b|^2 - 2|b| a.u), so a
+        memory-mapped gallery is never rescaled in memory.
+        """
+        names = ["Unknown"] * len(face_encodings)
+        if len(face_encodings) == 0:
+            return names
+        faces = np.asarray(face_encodings, dtype=np.float32).reshape(-1, 128)
+        face_sq = (faces * faces).sum(axis=1)
+        best_distances = np.full(len(faces), np.inf, dtype=np.float32)
+        for unit, norms, gallery_names in self._galleries():
+            if len(unit) == 0:
+                continue
+            norms = np.asarray(norms)
+            sq = face_sq[:, None] + (norms * norms)[None, :] - 2.0 * (faces @ unit.T) * norms[None, :]
+            best = np.argmin(sq, axis=1)
+            distances = np.sqrt(np.maximum(sq[np.arange(len(faces)), best], 0.0))
+            for i in np.flatnonzero(distances < best_distances):
+                best_distances[i] = distances[i]
+                names[i] = gallery_names[best[i]] if distances[i] <= self.match_tolerance else "Unknown"
+        return names
+
+    def detect_faces(self, frame):
+        """
+        Locate faces only (no encoding). Returns a list of (x1, y1, x2, y2) boxes
+        in original frame coordinates. Detection runs on a frame downscaled to
+        `detect_width`; `frame` may be a raw array or a PreparedFrame.
+        """
+        frame = prepare(frame)
+        scale = frame.scale_for_width(self.detect_width)
+        if HAS_FACE_RECOGNITION:
+            boxes = [(left, top, right, bottom)
+                     for (top, right, bottom, left) in face_recognition.face_locations(frame.resized_rgb(scale))]
+        else:
+            min_side = max(20, int(60 * scale))
+            faces = self._haar_cascade.detectMultiScale(frame.resized_gray(scale), scaleFactor=1.1, minNeighbors=5,
+                                                        minSize=(min_side, min_side))
+            boxes = [(x, y, x + w, y + h) for (x, y, w, h) in faces]
+        return to_original(boxes, scale, frame.shape)
+
+    def identify_faces(self, frame, bboxes):
+        """
+        Name the faces at the given (x1, y1, x2, y2) boxes, "Unknown" when unmatched.
+        Encoding uses the full-resolution frame.
+        """
+        if not bboxes:
+            return []
+        frame = prepare(frame)
+        if HAS_FACE_RECOGNITION:
+            locations = [(top, right, bottom, left) for (left, top, right, bottom) in bboxes]
+            face_encodings = face_recognition.face_encodings(frame.rgb, locations)
+            return self.match_encodings(face_encodings)
+
+        # Fallback path: LBPH on the Haar crops
+        names = ["Unknown"] * len(bboxes)
+        if getattr(self, "_lbph", None) is None or not self._lbph_trained or len(self._label_to_name) == 0:
+            return names
+        gray = frame.gray
+        for i, (left, top, right, bottom) in enumerate(bboxes):
+            try:
+                roi = gray[top:bottom, left:right]
+                roi_resized = cv2.resize(roi, (200, 200))
+                label_id, confidence = self._lbph.predict(roi_resized)
+                # Lower confidence means a better match in LBPH (typical threshold around 80)
+                if confidence < self.lbph_max_distance and 0 <= label_id < len(self._label_to_name):
+                    names[i] = self._label_to_name[label_id]
+            except Exception:
+                pass
+        return names
+
+    @timed("face_recognize_seconds")
     def recognize_faces(self, frame):
         """
         Detect faces in the frame and return a list of dictionaries:
         {'bbox': (x1, y1, x2, y2), 'name': name}
         """
-        results = []
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame = prepare(frame)
+        bboxes = self.detect_faces(frame)
+        names = self.identify_faces(frame, bboxes)
+        return [{"bbox": bbox, "name": name} for bbox, name in zip(bboxes, names)]
 
-        if HAS_FACE_RECOGNITION:
-            face_locations = face_recognition.face_locations(rgb_frame)
-            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-
-            for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding)
-                name = "Unknown"
-                face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                if len(face_distances) > 0:
-                    best_match_index = np.argmin(face_distances)
-                    if best_match_index < len(matches) and matches[best_match_index]:
-                        name = self.known_face_names[best_match_index]
-                results.append({
-                    "bbox": (left, top, right, bottom),
-                    "name": name
-                })
-            return results
-
-        # Fallback path: OpenCV Haar cascade detection only (no recognition)
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self._haar_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(60, 60))
-        for (x, y, w, h) in faces:
-            left, top, right, bottom = x, y, x + w, y + h
-            name = "Unknown"
-            if getattr(self, "_lbph", None) is not None and self._lbph_trained and len(self._label_to_name) > 0:
-                try:
-                    roi = gray[y:y+h, x:x+w]
-                    roi_resized = cv2.resize(roi, (200, 200))
-                    label_id, confidence = self._lbph.predict(roi_resized)
-                    # Lower confidence means a better match in LBPH (typical threshold around 80)
-                    if confidence < 85 and 0 <= label_id < len(self._label_to_name):
-                        name = self._label_to_name[label_id]
-                except Exception:
-                    pass
-            results.append({
-                "bbox": (left, top, right, bottom),
-                "name": name
-            })
-        return results
+
+class FaceTrack:
+    __slots__ = ("track_id", "bbox", "name", "identified_bbox", "identified_at", "last_seen")
+
+    def __init__(self, track_id, bbox, now):
+        self.track_id = track_id
+        self.bbox = bbox
+        self.name = "Unknown"
+        self.identified_bbox = None
+        self.identified_at = 0.0
+        self.last_seen = now
+
+
+class FaceTracker:
+    """
+    Associates face detections across frames by IoU and caches each track's
+    identity, so the encoder only runs for new, drifted or stale tracks.
+    """
+    def __init__(self, recognizer, iou_match=None, drift_iou=None, identity_ttl=None, max_missed_seconds=None):
+        self.recognizer = recognizer
+        self.iou_match = FACE_TRACKING["iou_match"] if iou_match is None else iou_match
+        self.drift_iou = FACE_TRACKING["drift_iou"] if drift_iou is None else drift_iou
+        self.identity_ttl = FACE_TRACKING["identity_ttl"] if identity_ttl is None else identity_ttl
+        self.max_missed_seconds = FACE_TRACKING["max_missed_seconds"] if max_missed_seconds is None else max_missed_seconds
+        self.tracks = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.encoder_runs = 0
+        self.encoder_skips = 0
+
+    def _associate(self, bboxes, now):
+        """Greedy highest-IoU association; returns the track for each detection."""
+        assigned = [None] * len(bboxes)
+        live = [t for t in self.tracks if now - t.last_seen <= self.max_missed_seconds]
+        if live and bboxes:
+            iou = iou_matrix(bboxes, [t.bbox for t in live])
+            order = np.dstack(np.unravel_index(np.argsort(-iou, axis=None), iou.shape))[0]
+            used_tracks = set()
+            for d, t in order:
+                if iou[d, t] < self.iou_match:
+                    break
+                if assigned[d] is None and t not in used_tracks:
+                    assigned[d] = live[t]
+                    used_tracks.add(t)
+        for d, track in enumerate(assigned):
+            if track is None:
+                track = FaceTrack(self._next_id, bboxes[d], now)
+                self._next_id += 1
+                live.append(track)
+                assigned[d] = track
+            track.bbox = bboxes[d]
+            track.last_seen = now
+        self.tracks = live
+        return assigned
+
+    def _needs_identity(self, track, now):
+        if track.identified_bbox is None or now - track.identified_at > self.identity_ttl:
+            return True
+        return iou_matrix([track.bbox], [track.identified_bbox])[0, 0] < self.drift_iou
+
+    @timed("face_track_seconds")
+    def update(self, frame, now=None):
+        """
+        Track faces in the frame and return the same dicts as
+        FaceRecognizer.recognize_faces, plus a stable 'track_id'.
+        """
+        now = time.time() if now is None else now
+        frame = prepare(frame)
+        bboxes = self.recognizer.detect_faces(frame)
+        with self._lock:
+            tracks = self._associate(bboxes, now)
+            pending = [t for t in tracks if self._needs_identity(t, now)]
+            if pending:
+                names = self.recognizer.identify_faces(frame, [t.bbox for t in pending])
+                for track, name in zip(pending, names):
+                    track.name = name
+                    track.identified_bbox = track.bbox
+                    track.identified_at = now
+            self.encoder_runs += len(pending)
+            self.encoder_skips += len(tracks) - len(pending)
+            return [{"bbox": t.bbox, "name": t.name, "track_id": t.track_id} for t in tracks]
@@ -1 +1,189 @@
-# later updation
\ No newline at end of file
+import math
+import time
+import threading
+import numpy as np
+from utils.helpers import iou_matrix
+from config.settings import NAVIGATION
+
+# Typical real-world heights in metres, used to turn bbox height into distance
+HEIGHT_PRIORS = {
+    "person": 1.7, "bicycle": 1.1, "car": 1.5, "motorcycle": 1.2, "bus": 3.0, "truck": 3.0, "train": 3.5,
+    "traffic light": 1.0, "fire hydrant": 0.8, "stop sign": 0.75, "parking meter": 1.3, "bench": 0.9,
+    "dog": 0.6, "cat": 0.3, "horse": 1.6, "cow": 1.4, "backpack": 0.5, "suitcase": 0.7, "chair": 0.9,
+    "couch": 0.9, "potted plant": 0.6, "bed": 0.6, "dining table": 0.75, "toilet": 0.75, "tv": 0.6,
+    "refrigerator": 1.8, "oven": 0.9, "sink": 0.3, "bottle": 0.25, "cup": 0.1, "umbrella": 1.0,
+}
+DEFAULT_HEIGHT = 1.0
+
+
+class Navigator:
+    """
+    Turns per-frame detections into obstacles with a left/center/right
+    direction, an approximate distance (pinhole model with per-class height
+    priors) and a time-to-collision from the smoothed approach speed.
+    Track state is held in parallel NumPy arrays so an update is a handful
+    of vector ops regardless of how many objects are in view.
+    """
+    def __init__(self, hfov_deg=None, iou_match=0.3, max_missed_seconds=1.0):
+        self.hfov_deg = NAVIGATION["hfov_deg"] if hfov_deg is None else hfov_deg
+        self.iou_match = iou_match
+        self.max_missed_seconds = max_missed_seconds
+        self.smoothing = NAVIGATION["smoothing"]
+        self.urgent_distance = NAVIGATION["urgent_distance"]
+        self.urgent_ttc = NAVIGATION["urgent_ttc"]
+        self.announce_cooldown = NAVIGATION["announce_cooldown"]
+        self.center_fraction = NAVIGATION["center_fraction"]
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._reset_tracks()
+
+    def _reset_tracks(self):
+        self.track_ids = np.empty(0, dtype=np.int64)
+        self.track_boxes = np.empty((0, 4), dtype=np.float32)
+        self.track_labels = np.empty(0, dtype=object)
+        self.track_distance = np.empty(0, dtype=np.float32)
+        self.track_speed = np.empty(0, dtype=np.float32)
+        self.track_seen = np.empty(0, dtype=np.float64)
+        self.track_announced = np.empty(0, dtype=np.float64)
+
+    def _distances(self, boxes, labels, frame_width):
+        focal = (frame_width / 2.0) / math.tan(math.radians(self.hfov_deg) / 2.0)
+        heights = np.array([HEIGHT_PRIORS.get(label, DEFAULT_HEIGHT) for label in labels], dtype=np.float32)
+        pixel_heights = np.maximum(boxes[:, 3] - boxes[:, 1], 1.0)
+        return focal * heights / pixel_heights
+
+    def _directions(self, boxes, frame_width):
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2.0 / frame_width
+        half = self.center_fraction / 2.0
+        return np.where(cx < 0.5 - half, "left", np.where(cx > 0.5 + half, "right", "center"))
+
+    def annotate(self, objects, frame_shape):
+        """
+        Add 'direction' and 'distance' to each object dict (in place) without
+        touching the tracks, for one-off queries that should not disturb the
+        speed estimates of the continuous loop.
+        """
+        if not objects:
+            return objects
+        boxes = np.array([obj["bbox"] for obj in objects], dtype=np.float32).reshape(-1, 4)
+        labels = [obj.get("label", "Unknown") for obj in objects]
+        distances = self._distances(boxes, labels, frame_shape[1])
+        directions = self._directions(boxes, frame_shape[1])
+        for i, obj in enumerate(objects):
+            obj["direction"] = str(directions[i])
+            obj["distance"] = round(float(distances[i]), 1)
+        return objects
+
+    def update(self, objects, frame_shape, now=None):
+        """
+        Update tracks with this frame's detections ({'bbox', 'label', ...}).
+        Adds 'direction', 'distance', 'ttc', 'track_id' and 'urgent' to each
+        object dict (in place) and returns them.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._update(objects, frame_shape[1], now)
+
+    def _update(self, objects, frame_width, now):
+        # Forget tracks that have been out of view for too long
+        alive = (now - self.track_seen) <= self.max_missed_seconds
+        if not alive.all():
+            for name in ("track_ids", "track_boxes", "track_labels", "track_distance",
+                         "track_speed", "track_seen", "track_announced"):
+                setattr(self, name, getattr(self, name)[alive])
+        if not objects:
+            return objects
+
+        boxes = np.array([obj["bbox"] for obj in objects], dtype=np.float32).reshape(-1, 4)
+        labels = np.array([obj.get("label", "Unknown") for obj in objects], dtype=object)
+        raw_distance = self._distances(boxes, labels, frame_width)
+        directions = self._directions(boxes, frame_width)
+
+        # Greedy association: best IoU first, same label only
+        match = np.full(len(objects), -1, dtype=np.int64)
+        if len(self.track_ids):
+            iou = iou_matrix(boxes, self.track_boxes)
+            iou[labels[:, None] != self.track_labels[None, :]] = 0.0
+            taken = np.zeros(len(self.track_ids), dtype=bool)
+            for flat in np.argsort(-iou, axis=None):
+                d, t = divmod(int(flat), len(self.track_ids))
+                if iou[d, t] < self.iou_match:
+                    break
+                if match[d] < 0 and not taken[t]:
+                    match[d] = t
+                    taken[t] = True
+
+        matched = match >= 0
+        t_idx = match[matched]
+        distance = raw_distance.copy()
+        speed = np.zeros(len(objects), dtype=np.float32)
+        if t_idx.size:
+            prev_distance = self.track_distance[t_idx]
+            dt = np.maximum(now - self.track_seen[t_idx], 1e-3)
+            a = self.smoothing
+            distance[matched] = a * prev_distance + (1 - a) * raw_distance[matched]
+            # Positive speed = closing in
+            speed[matched] = a * self.track_speed[t_idx] + (1 - a) * (prev_distance - distance[matched]) / dt
+            self.track_boxes[t_idx] = boxes[matched]
+            self.track_distance[t_idx] = distance[matched]
+            self.track_speed[t_idx] = speed[matched]
+            self.track_seen[t_idx] = now
+
+        new = ~matched
+        n_new = int(new.sum())
+        if n_new:
+            new_ids = np.arange(self._next_id, self._next_id + n_new)
+            self._next_id += n_new
+            match[new] = len(self.track_ids) + np.arange(n_new)
+            self.track_ids = np.concatenate([self.track_ids, new_ids])
+            self.track_boxes = np.concatenate([self.track_boxes, boxes[new]])
+            self.track_labels = np.concatenate([self.track_labels, labels[new]])
+            self.track_distance = np.concatenate([self.track_distance, distance[new]])
+            self.track_speed = np.concatenate([self.track_speed, speed[new]])
+            self.track_seen = np.concatenate([self.track_seen, np.full(n_new, now)])
+            self.track_announced = np.concatenate([self.track_announced, np.zeros(n_new)])
+
+        with np.errstate(divide="ignore"):
+            ttc = np.where(speed > 0.05, distance / np.maximum(speed, 1e-6), np.inf)
+        urgent = (directions == "center") & ((distance <= self.urgent_distance) | (ttc <= self.urgent_ttc))
+
+        for i, obj in enumerate(objects):
+            obj["direction"] = str(directions[i])
+            obj["distance"] = round(float(distance[i]), 1)
+            obj["ttc"] = round(float(ttc[i]), 1) if np.isfinite(ttc[i]) else None
+            obj["track_id"] = int(self.track_ids[match[i]])
+            obj["urgent"] = bool(urgent[i])
+        return objects
+
+    def hazards(self, obstacles, now=None):
+        """
+        Urgent obstacles that have not been announced within the cooldown,
+        closest first. Marks the returned ones as announced.
+        """
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            for obj in obstacles:
+                if not obj.get("urgent"):
+                    continue
+                idx = np.flatnonzero(self.track_ids == obj["track_id"])
+                if idx.size and now - self.track_announced[idx[0]] >= self.announce_cooldown:
+                    self.track_announced[idx[0]] = now
+                    due.append(obj)
+        return sorted(due, key=lambda obj: obj["distance"])
+
+    @staticmethod
+    def describe(obj):
+        text = f"{obj['label']} {obj['direction']}, {_spoken_distance(obj['distance'])}"
+        if obj.get("ttc") is not None and obj["ttc"] < 5:
+            text += ", approaching"
+        return text
+
+
+def _spoken_distance(metres):
+    # Whole metres would read anything under half a metre as "0 meters"
+    if metres < 0.5:
+        return "very close"
+    if metres < 3.0:
+        return f"{metres:.1f} meters"
+    return f"{metres:.0f} meters"
@@ -1,18 +1,256 @@
-from ultralytics import YOLO
+import ast
+import os
+import time
 import cv2
+import numpy as np
+from processing.preprocess import prepare, raw
+from utils.metrics import timed
+from config.settings import MODEL_PATHS, THRESHOLDS, DETECTION
+
+# Optional lightweight runtime; ultralytics (and torch) are only imported when that backend is used
+try:
+    import onnxruntime as ort  # type: ignore
+    HAS_ONNXRUNTIME = True
+except Exception:
+    ort = None
+    HAS_ONNXRUNTIME = False
+
+PT_MODEL_PATH = "models/yolov8n.pt"
+
+COCO_NAMES = [
+    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", "boat", "traffic light",
+    "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat", "dog", "horse", "sheep", "cow",
+    "elephant", "bear", "zebra", "giraffe", "backpack", "umbrella", "handbag", "tie", "suitcase", "frisbee",
+    "skis", "snowboard", "sports ball", "kite", "baseball bat", "baseball glove", "skateboard", "surfboard",
+    "tennis racket", "bottle", "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple",
+    "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair", "couch",
+    "potted plant", "bed", "dining table", "toilet", "tv", "laptop", "mouse", "remote", "keyboard", "cell phone",
+    "microwave", "oven", "toaster", "sink", "refrigerator", "book", "clock", "vase", "scissors", "teddy bear",
+    "hair drier", "toothbrush"
+]
+
+
+def letterbox(frame, size):
+    """
+    Resize keeping aspect ratio and pad to size x size (YOLO grey 114).
+    Returns the padded image plus the scale and (pad_x, pad_y) to undo it.
+    """
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    pad_y, pad_x = (size - nh) // 2, (size - nw) // 2
+    out = np.full((size, size, 3), 114, dtype=np.uint8)
+    out[pad_y:pad_y + nh, pad_x:pad_x + nw] = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return out, scale, (pad_x, pad_y)
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy NMS over (N, 4) xyxy boxes; returns kept indices, best first."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores)
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+class OnnxYOLO:
+    """
+    YOLOv8 ONNX export run through onnxruntime, with NumPy letterbox
+    preprocessing and class-aware NMS postprocessing.
+    """
+    def __init__(self, model_path, input_size=640, conf=0.25, iou=0.45):
+        providers = [p for p in ("OpenVINOExecutionProvider", "CPUExecutionProvider")
+                     if p in ort.get_available_providers()]
+        self.session = ort.InferenceSession(model_path, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+        shape = self.session.get_inputs()[0].shape
+        self.input_size = shape[2] if isinstance(shape[2], int) else input_size
+        self.dynamic_batch = not isinstance(shape[0], int)
+        self.conf = conf
+        self.iou = iou
+        self.allowed_classes = None
+        self.names = COCO_NAMES
+        # ultralytics stores the class names in the export metadata
+        names = self.session.get_modelmeta().custom_metadata_map.get("names")
+        if names:
+            try:
+                parsed = ast.literal_eval(names)
+                self.names = [parsed[i] for i in sorted(parsed)] if isinstance(parsed, dict) else list(parsed)
+            except Exception:
+                pass
+
+    def __call__(self, frame):
+        """Return (boxes xyxy float32 (N, 4), scores (N,), class ids (N,)) in frame coordinates."""
+        return self.infer_batch([frame])[0]
+
+    def infer_batch(self, frames):
+        """
+        Run several frames through the network; one forward pass when the
+        model has a dynamic batch axis, otherwise one pass per frame.
+        """
+        # PreparedFrames keep their letterbox, so a frame detected twice is resized once
+        letterboxed = [prepare(frame).letterbox(self.input_size, letterbox) for frame in frames]
+        blobs = np.stack([image[:, :, ::-1].transpose(2, 0, 1) for image, _, _ in letterboxed]).astype(np.float32)
+        blobs /= 255.0
+        if self.dynamic_batch:
+            preds = self.session.run(None, {self.input_name: blobs})[0]
+        else:
+            preds = [self.session.run(None, {self.input_name: blob[None]})[0][0] for blob in blobs]
+        return [self._postprocess(pred, frame, scale, pad)
+                for pred, frame, (_, scale, pad) in zip(preds, frames, letterboxed)]
+
+    def _postprocess(self, pred, frame, scale, pad):
+        pad_x, pad_y = pad
+        # (4 + classes, anchors) -> (anchors, 4 + classes)
+        pred = pred.T
+        class_scores = pred[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(pred)), class_ids]
+        mask = scores >= self.conf
+        if self.allowed_classes is not None:
+            mask &= np.isin(class_ids, self.allowed_classes)
+        pred, scores, class_ids = pred[mask], scores[mask], class_ids[mask]
+        if not len(pred):
+            return np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int64)
+
+        cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        # Offset boxes per class so a single NMS pass never suppresses across classes
+        offsets = class_ids[:, None].astype(np.float32) * (self.input_size + 1)
+        keep = nms(boxes + offsets, scores, self.iou)
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        boxes -= np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)
+        boxes /= scale
+        fh, fw = frame.shape[:2]
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, fw - 1)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, fh - 1)
+        return boxes, scores, class_ids
+
 
 class ObjectDetector:
-    def __init__(self, model_path="models/yolov8n.pt"):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path=None, backend=None, conf=None, classes=None):
+        backend = DETECTION["backend"] if backend is None else backend
+        if backend == "auto":
+            backend = "onnx" if HAS_ONNXRUNTIME else "ultralytics"
+        self.backend = backend
+        self.conf = THRESHOLDS["object_conf"] if conf is None else conf
+        start = time.perf_counter()
+        if backend == "onnx":
+            model_path = model_path or MODEL_PATHS["yolo"]
+            if not os.path.exists(model_path):
+                model_path = self._export_onnx(model_path)
+            self.model = OnnxYOLO(model_path, DETECTION["input_size"], conf=self.conf, iou=DETECTION["iou"])
+        else:
+            from ultralytics import YOLO
+            self.model = YOLO(model_path or PT_MODEL_PATH)
+        self.names = self.model.names
+        self.load_seconds = time.perf_counter() - start
+        self.frames = 0
+        self.infer_seconds = 0.0
+        self.set_classes(DETECTION["classes"] if classes is None else classes)
+
+    def set_classes(self, labels):
+        """Restrict detections to these labels (None or empty = every class)."""
+        if not labels:
+            self.allowed_classes = None
+        else:
+            names = self.names.items() if isinstance(self.names, dict) else enumerate(self.names)
+            wanted = set(labels)
+            self.allowed_classes = np.array(sorted(i for i, name in names if name in wanted), dtype=np.int64)
+        if self.backend == "onnx":
+            self.model.allowed_classes = self.allowed_classes
+
+    @staticmethod
+    def _export_onnx(onnx_path):
+        """One-time export of the .pt weights next to the configured ONNX path."""
+        from ultralytics import YOLO
+        # Dynamic axes so detect_batch can run several frames in one forward pass
+        exported = YOLO(PT_MODEL_PATH).export(format="onnx", imgsz=DETECTION["input_size"], dynamic=True)
+        if os.path.abspath(exported) != os.path.abspath(onnx_path):
+            os.replace(exported, onnx_path)
+        return onnx_path
 
+    def _infer(self, frames):
+        """Per-frame (boxes, scores, class_ids) arrays, already confidence/class filtered."""
+        if self.backend == "onnx":
+            return self.model.infer_batch(frames)
+        classes = None if self.allowed_classes is None else self.allowed_classes.tolist()
+        outputs = []
+        for result in self.model([raw(frame) for frame in frames], conf=self.conf, classes=classes, verbose=False):
+            boxes = result.boxes
+            outputs.append((boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(),
+                            boxes.cls.cpu().numpy().astype(np.int64)))
+        return outputs
+
+    def _to_dicts(self, boxes, scores, class_ids):
+        return [{"bbox": tuple(box), "label": self.names[cls], "score": round(score, 3)}
+                for box, score, cls in zip(boxes.astype(int).tolist(), scores.tolist(), class_ids.tolist())]
+
+    def detect_batch(self, frames):
+        """
+        Detect objects in several frames with a single forward pass.
+        Returns one list of {'bbox', 'label', 'score'} dicts per frame.
+        """
+        if not len(frames):
+            return []
+        start = time.perf_counter()
+        results = [self._to_dicts(*output) for output in self._infer(frames)]
+        self.frames += len(frames)
+        self.infer_seconds += time.perf_counter() - start
+        return results
+
+    @timed("object_detect_seconds")
     def detect(self, frame):
-        results = self.model(frame)[0]
-        objects = []
-        for result in results.boxes:
-            x1, y1, x2, y2 = result.xyxy[0]
-            label = self.model.names[int(result.cls[0])]
-            objects.append({"bbox": (int(x1), int(y1), int(x2), int(y2)), "label": label})
-        return objects
+        return self.detect_batch([frame])[0]
+
+    def detect_tiled(self, frame, grid=(2, 2), overlap=0.15):
+        """
+        Split a large frame into overlapping tiles, detect them as one batch,
+        then map boxes back and suppress duplicates along the seams.
+        """
+        frame = raw(frame)
+        h, w = frame.shape[:2]
+        rows, cols = grid
+        th, tw = int(h / rows * (1 + overlap)), int(w / cols * (1 + overlap))
+        tiles, origins = [], []
+        for r in range(rows):
+            for c in range(cols):
+                y0 = min(int(r * h / rows), h - th) if rows > 1 else 0
+                x0 = min(int(c * w / cols), w - tw) if cols > 1 else 0
+                tiles.append(frame[y0:y0 + th, x0:x0 + tw])
+                origins.append((x0, y0))
+        start = time.perf_counter()
+        outputs = self._infer(tiles)
+        boxes = np.concatenate([b + np.array([x0, y0, x0, y0], dtype=np.float32)
+                                for (b, _, _), (x0, y0) in zip(outputs, origins)])
+        scores = np.concatenate([s for _, s, _ in outputs])
+        class_ids = np.concatenate([c for _, _, c in outputs])
+        if len(boxes):
+            offsets = class_ids[:, None].astype(np.float32) * (max(h, w) + 1)
+            keep = nms(boxes + offsets, scores, DETECTION["iou"])
+            boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+        self.frames += 1
+        self.infer_seconds += time.perf_counter() - start
+        return self._to_dicts(boxes, scores, class_ids)
+
+    def stats(self):
+        """Model load time and mean per-frame latency for the active backend."""
+        return {
+            "backend": self.backend,
+            "load_ms": round(self.load_seconds * 1000, 1),
+            "frames": self.frames,
+            "mean_frame_ms": round(self.infer_seconds * 1000 / self.frames, 1) if self.frames else 0.0,
+        }
 
     def draw_boxes(self, frame, objects):
         for obj in objects:
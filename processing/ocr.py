@@ -1,15 +1,416 @@
 import cv2
+from abc import ABC, abstractmethod
+import multiprocessing as mp
+import os
+import platform
+import threading
+import time
+import numpy as np
 import pytesseract
+from concurrent.futures import ProcessPoolExecutor
+from processing.preprocess import prepare
+from utils.metrics import timed, timer
+from config.settings import THRESHOLDS, OCR, PIPELINE
+
+if platform.system() == "Windows":
+    pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+# Optional in-process Tesseract bindings: keeps the engine and language data loaded across calls
+try:
+    import tesserocr  # type: ignore
+    HAS_TESSEROCR = True
+except Exception:
+    tesserocr = None
+    HAS_TESSEROCR = False
+
+# Page segmentation modes: automatic for whole frames, single block for text crops
+PSM_AUTO = 3
+PSM_SINGLE_BLOCK = 6
+
+
+class OCREngine(ABC):
+    """
+    Common interface of the OCR backends: image_to_data (pytesseract's dict
+    layout), image_to_string, stats() and close(). Subclasses call
+    _record(start) after each recognition so startup cost and per-call
+    latency are reported separately.
+    """
+    name = None
+
+    def __init__(self, lang="eng"):
+        self.lang = lang
+        self.startup_seconds = 0.0
+        self.calls = 0
+        self.call_seconds = 0.0
+
+    @abstractmethod
+    def image_to_data(self, gray, psm=PSM_AUTO):
+        """Words with boxes, confidences and layout numbers, in pytesseract's dict layout."""
+
+    @abstractmethod
+    def image_to_string(self, gray, psm=PSM_AUTO):
+        """Plain text of the image."""
+
+    def _record(self, start):
+        self.calls += 1
+        self.call_seconds += time.perf_counter() - start
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "startup_ms": round(self.startup_seconds * 1000, 1),
+            "calls": self.calls,
+            "mean_call_ms": round(self.call_seconds * 1000 / self.calls, 1) if self.calls else 0.0,
+        }
+
+    def close(self):
+        pass
+
+
+class PytesseractEngine(OCREngine):
+    """Spawns the tesseract CLI per call; all of its cost shows up as per-call time."""
+    name = "pytesseract"
+
+    def image_to_data(self, gray, psm=PSM_AUTO):
+        start = time.perf_counter()
+        data = pytesseract.image_to_data(gray, lang=self.lang, config=f"--psm {psm}",
+                                         output_type=pytesseract.Output.DICT)
+        self._record(start)
+        return data
+
+    def image_to_string(self, gray, psm=PSM_AUTO):
+        start = time.perf_counter()
+        text = pytesseract.image_to_string(gray, lang=self.lang, config=f"--psm {psm}")
+        self._record(start)
+        return text
+
+
+class TesserocrEngine(OCREngine):
+    """
+    One long-lived TessBaseAPI fed raw grayscale buffers (no temp files, no
+    subprocess). Returns the same dict layout as pytesseract.image_to_data.
+    """
+    name = "tesserocr"
+
+    def __init__(self, lang="eng", tessdata=None):
+        super().__init__(lang)
+        start = time.perf_counter()
+        kwargs = {"lang": lang}
+        if tessdata:
+            kwargs["path"] = tessdata
+        self.api = tesserocr.PyTessBaseAPI(**kwargs)
+        self.startup_seconds = time.perf_counter() - start
+        # TessBaseAPI is not re-entrant
+        self._lock = threading.Lock()
+
+    def _set_image(self, gray, psm):
+        gray = np.ascontiguousarray(gray, dtype=np.uint8)
+        self.api.SetPageSegMode(psm)
+        self.api.SetImageBytes(gray.tobytes(), gray.shape[1], gray.shape[0], 1, gray.strides[0])
+
+    def image_to_data(self, gray, psm=PSM_AUTO):
+        start = time.perf_counter()
+        data = {key: [] for key in ("text", "conf", "left", "top", "width", "height",
+                                    "block_num", "par_num", "line_num")}
+        with self._lock:
+            self._set_image(gray, psm)
+            self.api.Recognize()
+            iterator = self.api.GetIterator()
+            word_level = tesserocr.RIL.WORD
+            block = par = line = 0
+            for r in tesserocr.iterate_level(iterator, word_level):
+                if r.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                    block, par, line = block + 1, 0, 0
+                if r.IsAtBeginningOf(tesserocr.RIL.PARA):
+                    par, line = par + 1, 0
+                if r.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    line += 1
+                box = r.BoundingBox(word_level)
+                if box is None:
+                    continue
+                x1, y1, x2, y2 = box
+                data["text"].append(r.GetUTF8Text(word_level) or "")
+                data["conf"].append(r.Confidence(word_level))
+                data["left"].append(x1)
+                data["top"].append(y1)
+                data["width"].append(x2 - x1)
+                data["height"].append(y2 - y1)
+                data["block_num"].append(block)
+                data["par_num"].append(par)
+                data["line_num"].append(line)
+        self._record(start)
+        return data
+
+    def image_to_string(self, gray, psm=PSM_AUTO):
+        start = time.perf_counter()
+        with self._lock:
+            self._set_image(gray, psm)
+            text = self.api.GetUTF8Text()
+        self._record(start)
+        return text
+
+    def close(self):
+        self.api.End()
+
+
+def create_engine(backend=None, lang=None):
+    """Build the configured engine; "auto" prefers tesserocr when it is installed."""
+    backend = OCR["backend"] if backend is None else backend
+    lang = OCR["lang"] if lang is None else lang
+    if backend == "tesserocr" or (backend == "auto" and HAS_TESSEROCR):
+        try:
+            return TesserocrEngine(lang, OCR["tessdata"])
+        except Exception as e:
+            if backend == "tesserocr":
+                raise
+            print(f"tesserocr unavailable ({e}), falling back to pytesseract")
+    return PytesseractEngine(lang)
+
+
+# One engine per worker process, created on first use and kept for the pool's lifetime
+_worker_engine = None
+
+def _ocr_region(roi, backend, tesseract_cmd):
+    """
+    Worker-process entry point: image_to_data on one preprocessed crop.
+    Returns (pid, data, engine counters) so the parent can report the
+    pool's engines alongside its own.
+    """
+    global _worker_engine
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    if _worker_engine is None or _worker_engine.name != backend:
+        _worker_engine = create_engine(backend)
+    data = _worker_engine.image_to_data(roi, PSM_SINGLE_BLOCK)
+    counters = (_worker_engine.startup_seconds, _worker_engine.calls, _worker_engine.call_seconds)
+    return os.getpid(), data, counters
+
+
+def find_text_regions(gray, min_area=None, padding=None):
+    """
+    Candidate text boxes (x1, y1, x2, y2) from a morphological gradient:
+    strokes light up in the gradient, a wide closing joins characters into
+    words/lines, and the resulting blobs are filtered by size and aspect.
+    """
+    min_area = OCR["min_region_area"] if min_area is None else min_area
+    padding = OCR["region_padding"] if padding is None else padding
+    h, w = gray.shape[:2]
+    grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, bw = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    joined = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3)))
+    contours, _ = cv2.findContours(joined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    regions = []
+    for contour in contours:
+        x, y, cw, ch = cv2.boundingRect(contour)
+        if cw * ch < min_area or ch < 8 or cw < ch * 0.8 or ch > h * 0.5:
+            continue
+        # Text blobs are reasonably dense with gradient pixels (measured on the
+        # rotated rect so slanted lines are not penalised)
+        rw, rh = cv2.minAreaRect(contour)[1]
+        if cv2.countNonZero(bw[y:y+ch, x:x+cw]) < 0.2 * max(rw * rh, 1.0):
+            continue
+        regions.append((max(0, x - padding), max(0, y - padding), min(w, x + cw + padding), min(h, y + ch + padding)))
+    return regions
+
+
+def _line_score(binary):
+    """Variance of dark pixels per row: high when text lines are horizontal."""
+    return float(np.var(np.count_nonzero(binary == 0, axis=1)))
+
+
+def prepare_region(gray, region):
+    """
+    Crop, deskew and binarize one region. Returns the crop and the 2x3
+    affine that maps crop pixels back to frame coordinates.
+    """
+    x1, y1, x2, y2 = region
+    crop = gray[y1:y2, x1:x2]
+    _, binary = cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # Tesseract expects dark text on a light background
+    if np.count_nonzero(binary) < binary.size / 2:
+        binary = cv2.bitwise_not(binary)
+
+    to_frame = np.array([[1.0, 0.0, x1], [0.0, 1.0, y1]])
+    ys, xs = np.nonzero(binary == 0)
+    if len(xs) > 10:
+        angle = cv2.minAreaRect(np.column_stack((xs, ys)).astype(np.float32))[-1]
+        # Fold into (-45, 45]: OpenCV reports [0, 90) or (-90, 0] depending on version
+        if angle > 45:
+            angle -= 90
+        elif angle <= -45:
+            angle += 90
+        if 1.0 < abs(angle) < 30:
+            # The rotation sense also depends on the version and on which side
+            # the rect was measured from, so try both and keep the one that
+            # levels the text lines best
+            ch, cw = binary.shape
+            best, best_score = None, _line_score(binary)
+            for candidate in (angle, -angle):
+                rotation = cv2.getRotationMatrix2D((cw / 2, ch / 2), candidate, 1.0)
+                rotated = cv2.warpAffine(binary, rotation, (cw, ch), flags=cv2.INTER_LINEAR,
+                                         borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+                score = _line_score(rotated)
+                if score > best_score:
+                    best, best_score = (rotated, rotation), score
+            if best is not None:
+                binary, rotation = best
+                inverse = cv2.invertAffineTransform(rotation)
+                to_frame = np.array([[1.0, 0.0, x1], [0.0, 1.0, y1]]) @ np.vstack([inverse, [0.0, 0.0, 1.0]])
+
+    # Small crops read much better when upscaled to ~32px text height
+    scale = 1.0
+    if binary.shape[0] < 32:
+        scale = 32.0 / binary.shape[0]
+        binary = cv2.resize(binary, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        to_frame = to_frame @ np.diag([1.0 / scale, 1.0 / scale, 1.0])
+    return binary, to_frame
 
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
 class OCRReader:
+    def __init__(self, min_conf=None, text_regions=None, workers=None, backend=None):
+        self.min_conf = THRESHOLDS["ocr_conf"] if min_conf is None else min_conf
+        self.text_regions = OCR["text_regions"] if text_regions is None else text_regions
+        self.workers = OCR["workers"] if workers is None else workers
+        self._pool = None
+        # Latest (startup_seconds, calls, call_seconds) of each pool worker's engine, by pid
+        self._worker_counters = {}
+        self.engine = create_engine(backend)
+
     def read(self, frame):
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        text = pytesseract.image_to_string(gray)
+        if self.text_regions:
+            return self.read_with_boxes(frame)["text"]
+        with timer("ocr_read_seconds"):
+            gray = prepare(frame).gray
+            text = self.engine.image_to_string(gray)
         return text
 
+    def engine_stats(self):
+        """
+        Engine startup cost and per-call latency, reported separately, over
+        this process's engine and those of the region pool workers.
+        """
+        report = self.engine.stats()
+        counters = list(self._worker_counters.values())
+        calls = self.engine.calls + sum(c[1] for c in counters)
+        call_seconds = self.engine.call_seconds + sum(c[2] for c in counters)
+        report.update({
+            "calls": calls,
+            "mean_call_ms": round(call_seconds * 1000 / calls, 1) if calls else 0.0,
+            "pool_workers": len(counters),
+            "pool_startup_ms": round(sum(c[0] for c in counters) * 1000, 1),
+            "pool_calls": sum(c[1] for c in counters),
+        })
+        return report
+
+    @timed("ocr_read_seconds")
+    def read_with_boxes(self, frame):
+        """
+        Run Tesseract once and return the spoken text together with its boxes:
+        {'text': str,
+         'words': [{'bbox': (x1, y1, x2, y2), 'text': str, 'conf': float}],
+         'lines': [{'bbox': (x1, y1, x2, y2), 'text': str, 'conf': float}]}
+        Empty words and words below `min_conf` are dropped.
+        With text_regions enabled only the detected text crops are OCR'd.
+        Text is read at full resolution; a PreparedFrame's grayscale is reused.
+        """
+        gray = prepare(frame).gray
+        if self.text_regions:
+            regions = find_text_regions(gray)
+            if regions or not OCR["fallback_full_frame"]:
+                return self._read_regions(gray, regions)
+        data = self.engine.image_to_data(gray)
+        return self._parse_data(data)
+
+    def _read_regions(self, gray, regions):
+        prepared = [prepare_region(gray, region) for region in regions]
+        crops = [crop for crop, _ in prepared]
+        if len(crops) > 1:
+            if self._pool is None:
+                # Camera, speech and scheduler threads are running by now, so never fork
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=mp.get_context(PIPELINE["start_method"]))
+            n = len(crops)
+            datas = []
+            for pid, data, counters in self._pool.map(_ocr_region, crops, [self.engine.name] * n,
+                                                      [pytesseract.pytesseract.tesseract_cmd] * n):
+                self._worker_counters[pid] = counters
+                datas.append(data)
+        else:
+            datas = [self.engine.image_to_data(crop, PSM_SINGLE_BLOCK) for crop in crops]
+
+        words, lines = [], []
+        for data, (_, to_frame) in zip(datas, prepared):
+            parsed = self._parse_data(data, to_frame)
+            words.extend(parsed["words"])
+            lines.extend(parsed["lines"])
+        lines = _reading_order(lines)
+        return {
+            "text": "\n".join(line["text"] for line in lines),
+            "words": words,
+            "lines": lines,
+        }
+
+    def _parse_data(self, data, to_frame=None):
+        words = []
+        lines = {}
+        for i in range(len(data["text"])):
+            word = str(data["text"][i]).strip()
+            conf = float(data["conf"][i])
+            # Only level-5 (word) entries carry text; layout levels have conf -1
+            if not word or conf < self.min_conf:
+                continue
+            x1, y1 = data["left"][i], data["top"][i]
+            x2, y2 = x1 + data["width"][i], y1 + data["height"][i]
+            if to_frame is not None:
+                corners = np.array([[x1, y1, 1], [x2, y1, 1], [x1, y2, 1], [x2, y2, 1]], dtype=np.float64) @ to_frame.T
+                lo, hi = np.floor(corners.min(axis=0)), np.ceil(corners.max(axis=0))
+                x1, y1, x2, y2 = int(lo[0]), int(lo[1]), int(hi[0]), int(hi[1])
+            entry = {"bbox": (x1, y1, x2, y2), "text": word, "conf": conf}
+            words.append(entry)
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append(entry)
+
+        line_entries = []
+        for key in sorted(lines):
+            members = lines[key]
+            line_entries.append({
+                "bbox": (min(w["bbox"][0] for w in members), min(w["bbox"][1] for w in members),
+                         max(w["bbox"][2] for w in members), max(w["bbox"][3] for w in members)),
+                "text": " ".join(w["text"] for w in members),
+                "conf": sum(w["conf"] for w in members) / len(members),
+            })
+        return {
+            "text": "\n".join(line["text"] for line in line_entries),
+            "words": words,
+            "lines": line_entries,
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        self.engine.close()
+
     def draw_text(self, frame, text, x=10, y=30):
         for i, line in enumerate(text.splitlines()):
             cv2.putText(frame, line, (x, y + i*25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
         return frame
+
+
+def _reading_order(lines):
+    """Sort lines top-to-bottom, then left-to-right within a shared row."""
+    if not lines:
+        return lines
+    lines = sorted(lines, key=lambda line: line["bbox"][1])
+    rows, current = [], [lines[0]]
+    for line in lines[1:]:
+        prev = current[-1]["bbox"]
+        # Same row when the vertical centre falls inside the previous line's span
+        centre = (line["bbox"][1] + line["bbox"][3]) / 2
+        if prev[1] <= centre <= prev[3]:
+            current.append(line)
+        else:
+            rows.append(current)
+            current = [line]
+    rows.append(current)
+    return [line for row in rows for line in sorted(row, key=lambda line: line["bbox"][0])]
@@ -0,0 +1,355 @@
+import atexit
+import itertools
+import multiprocessing as mp
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+import numpy as np
+from processing.preprocess import raw
+from utils.metrics import REGISTRY
+from config.settings import PIPELINE
+
+
+# Worker factories run inside the child process; each returns (callable(frame, *args), info)
+def _make_object(**options):
+    from processing.object_detection import ObjectDetector
+    detector = ObjectDetector(**options)
+    return detector.detect, {"names": detector.names}
+
+
+def _make_ocr(tesseract_cmd=None, **options):
+    import pytesseract
+    from processing.ocr import OCRReader
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    reader = OCRReader(**options)
+    return reader.read_with_boxes, {}
+
+
+def _make_faces(known_faces=None, **options):
+    from processing.face_recognition import FaceRecognizer, FaceTracker
+    recognizer = FaceRecognizer()
+    if known_faces:
+        recognizer.load_known_faces(known_faces)
+    recognizer.load_gallery()
+    tracker = FaceTracker(recognizer, **options)
+    return tracker.update, {"known_face_names": list(recognizer.known_face_names)}
+
+
+WORKER_FACTORIES = {"object": _make_object, "ocr": _make_ocr, "faces": _make_faces}
+
+# Seconds between the metric dumps a worker sends back to the parent's registry
+METRICS_INTERVAL = 1.0
+
+
+def _worker_main(name, kind, options, shm_name, slot_bytes, tasks, results):
+    # Ctrl+C is handled by the parent, which shuts the workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        t0 = time.perf_counter()
+        try:
+            fn, info = WORKER_FACTORIES[kind](**options)
+        except Exception as e:
+            results.put(("failed", name, None, repr(e), time.perf_counter() - t0))
+            return
+        results.put(("ready", name, None, info, time.perf_counter() - t0))
+        # Timers inside the models record into this process's registry; ship it to the parent
+        last_metrics = time.perf_counter()
+        while True:
+            job = tasks.get()
+            if job is None:
+                break
+            job_id, slot, shape, dtype, args = job
+            # View straight into the parent's slot; nothing is copied or unpickled
+            frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=slot * slot_bytes)
+            t0 = time.perf_counter()
+            try:
+                results.put(("result", name, job_id, fn(frame, *args), time.perf_counter() - t0))
+            except Exception as e:
+                results.put(("error", name, job_id, repr(e), time.perf_counter() - t0))
+            del frame
+            if time.perf_counter() - last_metrics >= METRICS_INTERVAL:
+                last_metrics = time.perf_counter()
+                results.put(("metrics", name, None, REGISTRY.dump(), 0.0))
+    finally:
+        shm.close()
+
+
+class _Worker:
+    def __init__(self, name, kind, options, slots, slot_bytes, ctx, results):
+        self.name = name
+        self.kind = kind
+        self.options = options
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self.spawn(ctx, results)
+        self.restarts = 0
+        self.ready = threading.Event()
+        self.error = None
+        self.info = {}
+        self.load_seconds = None
+        self.submitted = 0
+        self.completed = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=200)   # submit -> result in the parent
+        self.compute = deque(maxlen=200)     # time spent inside the model call
+        self.busy_seconds = 0.0
+
+    def spawn(self, ctx, results):
+        """Create (not start) a fresh process and task queue over the same shared memory."""
+        self.free = list(range(self.slots))
+        self.tasks = ctx.Queue()
+        self.process = ctx.Process(target=_worker_main, name=f"vision-{self.name}",
+                                   args=(self.name, self.kind, self.options, self.shm.name, self.slot_bytes,
+                                         self.tasks, results))
+
+    @property
+    def alive(self):
+        return self.error is None and self.process.is_alive()
+
+    def slot_view(self, slot, shape, dtype):
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+
+class RemoteWorker:
+    """
+    Stand-in for a local model object: calling `method(frame, *args)` runs it
+    in the worker process. Attributes reported by the worker at startup
+    (e.g. `names`, `known_face_names`) are available directly.
+    """
+    def __init__(self, pipeline, kind, method, info):
+        self._pipeline = pipeline
+        self.kind = kind
+        self.__dict__.update(info)
+        setattr(self, method, self.__call__)
+
+    def __call__(self, frame, *args):
+        return self._pipeline.call(self.kind, frame, *args)
+
+
+class VisionPipeline:
+    """
+    Runs ObjectDetector, OCRReader and FaceRecognizer in their own worker
+    processes. Frames are copied once into a shared-memory slot owned by the
+    target worker and only the slot index travels over the task queue;
+    results come back on a single queue drained by a dispatcher thread.
+    A slot is reused only after its result has arrived, so a worker never
+    sees a frame being overwritten. With more than one replica per model,
+    jobs go to the replica with the most free slots.
+    """
+    METHODS = {"object": "detect", "ocr": "read_with_boxes", "faces": "update"}
+
+    def __init__(self, kinds=None, options=None, replicas=None, slots=None, max_frame_shape=None):
+        replicas = dict(PIPELINE["replicas"] if replicas is None else replicas)
+        self.kinds = list(kinds or replicas)
+        self.options = options or {}
+        self.replicas = {kind: max(1, replicas.get(kind, 1)) for kind in self.kinds}
+        self.slots = PIPELINE["slots"] if slots is None else slots
+        shape = PIPELINE["max_frame_shape"] if max_frame_shape is None else max_frame_shape
+        self.slot_bytes = int(np.prod(shape))
+        self.workers = {}
+        self._by_kind = {kind: [] for kind in self.kinds}
+        self._pending = {}
+        self._ids = itertools.count()
+        self._cond = threading.Condition()
+        self._ctx = None
+        self._results = None
+        self._dispatcher = None
+        self._closed = False
+        self.dropped = {kind: 0 for kind in self.kinds}
+
+    def start(self):
+        ctx = self._ctx = mp.get_context(PIPELINE["start_method"])
+        self._results = ctx.Queue()
+        for kind in self.kinds:
+            for i in range(self.replicas[kind]):
+                name = f"{kind}#{i}"
+                worker = _Worker(name, kind, self.options.get(kind, {}), self.slots, self.slot_bytes, ctx, self._results)
+                self.workers[name] = worker
+                self._by_kind[kind].append(worker)
+        for worker in self.workers.values():
+            worker.process.start()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True, name="vision-dispatch")
+        self._dispatcher.start()
+        # Workers are not daemonic (OCR forks its own region pool), so they must be told to exit
+        atexit.register(self.close)
+        return self
+
+    def wait_ready(self, kind, timeout=None):
+        """Block until every replica of `kind` has loaded; raises if none loaded."""
+        for worker in self._by_kind[kind]:
+            worker.ready.wait(timeout)
+        loaded = [w for w in self._by_kind[kind] if w.ready.is_set() and w.error is None]
+        if not loaded:
+            errors = [w.error for w in self._by_kind[kind] if w.error]
+            raise RuntimeError(f"{kind} worker failed: {errors[0] if errors else 'timed out'}")
+        return loaded[0].info
+
+    def client(self, kind, timeout=None):
+        info = self.wait_ready(kind, timeout)
+        return RemoteWorker(self, kind, self.METHODS[kind], info)
+
+    def _all_down(self, kind):
+        return not any(w.alive for w in self._by_kind[kind])
+
+    def _pick(self, kind):
+        candidates = [w for w in self._by_kind[kind] if w.free and w.alive and w.ready.is_set()]
+        return max(candidates, key=lambda w: len(w.free)) if candidates else None
+
+    def submit(self, kind, frame, *args, block=True, timeout=None):
+        """
+        Queue a frame for `kind` and return a Future for its result.
+        If every slot is busy, waits up to `timeout` (or returns None at once
+        when block=False); the frame is counted as dropped in that case.
+        Raises RuntimeError when every replica of `kind` has failed for good.
+        """
+        frame = np.ascontiguousarray(raw(frame))
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"frame of {frame.nbytes} bytes exceeds the {self.slot_bytes}-byte slot")
+        with self._cond:
+            if block:
+                self._cond.wait_for(lambda: self._closed or self._pick(kind) is not None or self._all_down(kind),
+                                    timeout)
+            if not self._closed and self._all_down(kind):
+                raise RuntimeError(f"every {kind} worker has failed")
+            worker = None if self._closed else self._pick(kind)
+            if worker is None:
+                self.dropped[kind] += 1
+                return None
+            slot = worker.free.pop()
+            job_id = next(self._ids)
+            future = Future()
+            self._pending[job_id] = (future, worker, slot, time.perf_counter())
+            worker.submitted += 1
+        # The slot is reserved, so the copy can happen outside the lock
+        worker.slot_view(slot, frame.shape, frame.dtype)[...] = frame
+        worker.tasks.put((job_id, slot, frame.shape, frame.dtype.str, args))
+        return future
+
+    def call(self, kind, frame, *args, timeout=None):
+        """Run `kind` on frame in its worker and wait (up to PIPELINE["call_timeout"]) for the result."""
+        timeout = PIPELINE["call_timeout"] if timeout is None else timeout
+        future = self.submit(kind, frame, *args, timeout=timeout)
+        if future is None:
+            raise TimeoutError(f"no free {kind} worker slot")
+        return future.result(timeout)
+
+    def _dispatch(self):
+        last_reap = time.perf_counter()
+        while not self._closed:
+            # Checked on a timer, not only when idle, so a busy kind cannot hide a dead one
+            if time.perf_counter() - last_reap >= 0.5:
+                last_reap = time.perf_counter()
+                self._reap_dead()
+            try:
+                status, name, job_id, payload, seconds = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            worker = self.workers[name]
+            if status == "metrics":
+                REGISTRY.load(payload, worker=name)
+                continue
+            if status in ("ready", "failed"):
+                worker.load_seconds = seconds
+                if status == "ready":
+                    worker.info = payload
+                else:
+                    worker.error = payload
+                    print(f"Vision worker {name} failed to start: {payload}")
+                worker.ready.set()
+                with self._cond:
+                    self._cond.notify_all()
+                continue
+            with self._cond:
+                pending = self._pending.pop(job_id, None)
+                if pending is None:
+                    # Late answer for a job already failed when its worker was restarted
+                    continue
+                future, worker, slot, submitted_at = pending
+                worker.free.append(slot)
+                worker.completed += 1
+                worker.busy_seconds += seconds
+                worker.compute.append(seconds)
+                worker.latencies.append(time.perf_counter() - submitted_at)
+                if status == "error":
+                    worker.errors += 1
+                self._cond.notify_all()
+            if status == "result":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(f"{name}: {payload}"))
+
+    def _reap_dead(self):
+        # A crashed worker never answers: fail its jobs instead of leaving callers waiting,
+        # then restart it (up to PIPELINE["max_restarts"] times) or mark it failed
+        with self._cond:
+            for worker in self.workers.values():
+                if worker.error is not None or worker.process.exitcode is None:
+                    continue
+                error = f"exited with code {worker.process.exitcode}"
+                for job_id, (future, owner, _, _) in list(self._pending.items()):
+                    if owner is worker:
+                        del self._pending[job_id]
+                        future.set_exception(RuntimeError(f"{worker.name} {error}"))
+                if worker.restarts < PIPELINE["max_restarts"] and not self._closed:
+                    worker.restarts += 1
+                    print(f"Vision worker {worker.name} {error}; restarting ({worker.restarts}/{PIPELINE['max_restarts']})")
+                    worker.ready.clear()
+                    worker.spawn(self._ctx, self._results)
+                    worker.process.start()
+                else:
+                    worker.error = error
+                    worker.ready.set()
+            self._cond.notify_all()
+
+    def stats(self):
+        """Per-worker throughput and latency (ms)."""
+        report = {}
+        for name, worker in self.workers.items():
+            lat = sorted(worker.latencies)
+            comp = sorted(worker.compute)
+            report[name] = {
+                "status": "failed" if worker.error else ("ready" if worker.ready.is_set() else "loading"),
+                "load_s": round(worker.load_seconds, 2) if worker.load_seconds is not None else None,
+                "submitted": worker.submitted,
+                "completed": worker.completed,
+                "errors": worker.errors,
+                "restarts": worker.restarts,
+                "in_flight": self.slots - len(worker.free),
+                "throughput_fps": round(worker.completed / worker.busy_seconds, 1) if worker.busy_seconds else 0.0,
+                "latency_p50_ms": round(lat[len(lat) // 2] * 1000, 1) if lat else 0.0,
+                "latency_p95_ms": round(lat[int(len(lat) * 0.95)] * 1000, 1) if lat else 0.0,
+                "compute_p50_ms": round(comp[len(comp) // 2] * 1000, 1) if comp else 0.0,
+            }
+        report["dropped"] = dict(self.dropped)
+        return report
+
+    def close(self, timeout=2.0):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self.workers.values():
+            try:
+                worker.tasks.put(None)
+            except Exception:
+                pass
+        for worker in self.workers.values():
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        for future, _, _, _ in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        for worker in self.workers.values():
+            worker.shm.close()
+            worker.shm.unlink()
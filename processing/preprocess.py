@@ -0,0 +1,92 @@
+import cv2
+import numpy as np
+
+
+class PreparedFrame:
+    """
+    One BGR frame plus the derived versions the vision stages need (RGB,
+    grayscale, downscaled copies, the YOLO letterbox), each computed on
+    first use and then shared, so a frame seen by detection, faces and OCR
+    is converted at most once per representation.
+    """
+    def __init__(self, frame):
+        self.bgr = frame
+        self.shape = frame.shape
+        self._cache = {}
+
+    def _get(self, key, build):
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = build()
+        return value
+
+    @property
+    def rgb(self):
+        return self._get("rgb", lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB))
+
+    @property
+    def gray(self):
+        return self._get("gray", lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+
+    def scale_for_width(self, width):
+        """Downscale factor (<= 1) that brings the frame to at most `width` pixels wide."""
+        return min(1.0, width / float(self.shape[1])) if width else 1.0
+
+    def resized(self, scale):
+        """BGR frame scaled by `scale` (the frame itself when scale is 1)."""
+        if scale >= 1.0:
+            return self.bgr
+        return self._get(("bgr", scale), lambda: cv2.resize(self.bgr, None, fx=scale, fy=scale,
+                                                             interpolation=cv2.INTER_AREA))
+
+    def resized_rgb(self, scale):
+        if scale >= 1.0:
+            return self.rgb
+        # Convert the small frame, not the full one
+        return self._get(("rgb", scale), lambda: cv2.cvtColor(self.resized(scale), cv2.COLOR_BGR2RGB))
+
+    def resized_gray(self, scale):
+        if scale >= 1.0:
+            return self.gray
+        if "gray" in self._cache:
+            return self._get(("gray", scale), lambda: cv2.resize(self.gray, None, fx=scale, fy=scale,
+                                                                  interpolation=cv2.INTER_AREA))
+        return self._get(("gray", scale), lambda: cv2.cvtColor(self.resized(scale), cv2.COLOR_BGR2GRAY))
+
+    def letterbox(self, size, build):
+        """Cached `build(frame, size)` result, e.g. object_detection.letterbox."""
+        return self._get(("letterbox", size), lambda: build(self.bgr, size))
+
+    def detached(self):
+        """
+        Copy of the pixels that keeps the conversions computed so far, for
+        handing to another thread while this frame gets drawn on.
+        """
+        other = PreparedFrame(self.bgr.copy())
+        other._cache = dict(self._cache)
+        return other
+
+
+def prepare(frame):
+    """Wrap a raw frame; PreparedFrame instances are passed through."""
+    return frame if isinstance(frame, PreparedFrame) else PreparedFrame(frame)
+
+
+def raw(frame):
+    """The BGR pixels of a raw or prepared frame."""
+    return frame.bgr if isinstance(frame, PreparedFrame) else frame
+
+
+def to_original(boxes, scale, shape):
+    """
+    Map (x1, y1, x2, y2) boxes found on a frame downscaled by `scale` back
+    to integer coordinates of the original frame, clipped to its bounds.
+    """
+    if not len(boxes):
+        return []
+    h, w = shape[:2]
+    b = np.asarray(boxes, dtype=np.float32).reshape(-1, 4) / scale
+    b = np.round(b).astype(int)
+    b[:, [0, 2]] = b[:, [0, 2]].clip(0, w)
+    b[:, [1, 3]] = b[:, [1, 3]].clip(0, h)
+    return [tuple(box) for box in b.tolist()]
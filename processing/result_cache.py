@@ -0,0 +1,93 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+from processing.preprocess import prepare
+from config.settings import RESULT_CACHE
+
+
+def dhash(gray, hash_size=16):
+    """
+    Difference hash of a grayscale image (or ROI) as an int of hash_size^2
+    bits: each bit says whether a pixel of the downscaled image is brighter
+    than its left neighbour, so it survives noise and small exposure shifts.
+    """
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class ResultCache:
+    """
+    LRU cache of stage results keyed by frame hash. A lookup hits when a
+    stored hash is within `tolerance` bits of the query and younger than
+    `ttl` seconds, so pointing at the same thing twice reuses the result.
+    """
+    def __init__(self, name, ttl=None, max_items=None, tolerance=None, hash_size=None):
+        self.name = name
+        ttl = RESULT_CACHE["ttl"] if ttl is None else ttl
+        self.ttl = ttl.get(name, 2.0) if isinstance(ttl, dict) else ttl
+        self.max_items = RESULT_CACHE["max_items"] if max_items is None else max_items
+        self.tolerance = RESULT_CACHE["tolerance"] if tolerance is None else tolerance
+        self.hash_size = RESULT_CACHE["hash_size"] if hash_size is None else hash_size
+        self._entries = OrderedDict()  # hash -> (stored_at, result)
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def key(self, frame):
+        return dhash(prepare(frame).gray, self.hash_size)
+
+    def lookup(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            best, best_distance = None, self.tolerance + 1
+            for stored, (stored_at, _) in list(self._entries.items()):
+                if now - stored_at > self.ttl:
+                    del self._entries[stored]
+                    self.counters["expired"] += 1
+                    continue
+                distance = hamming(key, stored)
+                if distance < best_distance:
+                    best, best_distance = stored, distance
+            if best is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["hits"] += 1
+            self._entries.move_to_end(best)
+            # Callers annotate results in place (e.g. Navigator), so hand out a copy
+            return copy.deepcopy(self._entries[best][1])
+
+    def store(self, key, result, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._entries[key] = (now, copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self.counters["evicted"] += 1
+
+    def cached(self, frame, compute):
+        """compute(frame), or a stored result for a frame hashing within tolerance of it."""
+        frame = prepare(frame)
+        key = self.key(frame)
+        result = self.lookup(key)
+        if result is None:
+            result = compute(frame)
+            self.store(key, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return dict(self.counters, size=len(self._entries),
+                        hit_rate=round(self.counters["hits"] / lookups, 3) if lookups else 0.0)
@@ -0,0 +1,376 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import logging.handlers
+import os
+import pstats
+import signal
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config.settings import METRICS
+
+# Seconds; spans camera reads (~ms) up to OCR of a dense page
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def dump(self):
+        return self.value
+
+    def load(self, value):
+        self.value = value
+
+    def prometheus(self):
+        return [f"{self.name}{_label_text(self.labels)} {self.value}"]
+
+
+class Gauge(Counter):
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """Cumulative buckets (for Prometheus) plus a window of recent samples for percentiles."""
+    def __init__(self, name, labels, buckets=DEFAULT_BUCKETS, window=512):
+        self.name = name
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self.recent.append(value)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self.recent)
+            count, total = self.count, self.sum
+        if not recent:
+            return {"count": count}
+        return {
+            "count": count,
+            "mean_ms": round(total / count * 1000, 2),
+            "p50_ms": round(recent[len(recent) // 2] * 1000, 2),
+            "p95_ms": round(recent[int(len(recent) * 0.95)] * 1000, 2),
+            "max_ms": round(recent[-1] * 1000, 2),
+        }
+
+    def dump(self):
+        with self._lock:
+            return list(self.bucket_counts), self.count, self.sum, list(self.recent)
+
+    def load(self, state):
+        bucket_counts, count, total, recent = state
+        with self._lock:
+            self.bucket_counts = list(bucket_counts)
+            self.count = count
+            self.sum = total
+            self.recent.clear()
+            self.recent.extend(recent)
+
+    def prometheus(self):
+        with self._lock:
+            counts, count, total = list(self.bucket_counts), self.count, self.sum
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{_label_text(self.labels + (('le', bound),))} {cumulative}")
+        lines.append(f"{self.name}_bucket{_label_text(self.labels + (('le', '+Inf'),))} {count}")
+        lines.append(f"{self.name}_sum{_label_text(self.labels)} {total}")
+        lines.append(f"{self.name}_count{_label_text(self.labels)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Named counters, gauges and histograms, optionally labelled, plus
+    collectors: callables evaluated at export time that return a flat
+    {name: number} dict (for components that already keep their own counters).
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+        self._reported_errors = set()
+
+    def _get(self, cls, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls(name, key[1])
+        return metric
+
+    def counter(self, name, **labels):
+        return self._get(Counter, name, labels)
+
+    def gauge(self, name, **labels):
+        return self._get(Gauge, name, labels)
+
+    def histogram(self, name, **labels):
+        return self._get(Histogram, name, labels)
+
+    def timer(self, name, **labels):
+        """Context manager recording the block's duration (seconds) into a histogram."""
+        return self.histogram(name, **labels).time()
+
+    def dump(self):
+        """Picklable state of every counter, gauge and histogram, for sending to another process."""
+        return [(type(metric).__name__, name, labels, metric.dump())
+                for (name, labels), metric in list(self._metrics.items())]
+
+    def load(self, state, **labels):
+        """
+        Overwrite this registry's copies of another process's metrics with
+        its dump(), adding `labels` (e.g. worker="ocr#0") to tell them apart.
+        """
+        classes = {"Counter": Counter, "Gauge": Gauge, "Histogram": Histogram}
+        for kind, name, metric_labels, values in state:
+            self._get(classes[kind], name, dict(metric_labels, **labels)).load(values)
+
+    def add_collector(self, prefix, fn):
+        self._collectors[prefix] = fn
+
+    def record_error(self, stage, exc):
+        """Count an exception that the caller is going to swallow; print the first of each kind."""
+        self.counter("errors_total", stage=stage).inc()
+        key = (stage, type(exc).__name__)
+        if key not in self._reported_errors:
+            self._reported_errors.add(key)
+            print(f"{stage} error (further ones only counted): {exc!r}")
+
+    def _collected(self):
+        values = {}
+        for prefix, fn in list(self._collectors.items()):
+            try:
+                for key, value in fn().items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        values[f"{prefix}_{key}"] = value
+            except Exception:
+                pass
+        return values
+
+    def snapshot(self):
+        report = {}
+        for (name, labels), metric in list(self._metrics.items()):
+            report[name + _label_text(labels)] = metric.snapshot()
+        report.update(self._collected())
+        return report
+
+    def prometheus(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.prometheus())
+        lines.extend(f"{name} {value}" for name, value in self._collected().items())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name, **labels):
+    return REGISTRY.counter(name, **labels)
+
+
+def gauge(name, **labels):
+    return REGISTRY.gauge(name, **labels)
+
+
+def histogram(name, **labels):
+    return REGISTRY.histogram(name, **labels)
+
+
+def timer(name, **labels):
+    return REGISTRY.timer(name, **labels)
+
+
+def record_error(stage, exc):
+    REGISTRY.record_error(stage, exc)
+
+
+def timed(name, **labels):
+    """Decorator: time every call of the function into histogram `name`."""
+    def decorator(fn):
+        hist = REGISTRY.histogram(name, **labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with hist.time():
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class JsonlExporter:
+    """Appends a snapshot line every `interval` seconds to a size-rotated JSONL file."""
+    def __init__(self, path, interval=None, max_bytes=None, backups=None, registry=REGISTRY):
+        self.registry = registry
+        self.interval = METRICS["jsonl_interval"] if interval is None else interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=METRICS["jsonl_max_bytes"] if max_bytes is None else max_bytes,
+            backupCount=METRICS["jsonl_backups"] if backups is None else backups)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._log = logging.getLogger(f"metrics.jsonl.{path}")
+        self._log.propagate = False
+        self._log.setLevel(logging.INFO)
+        self._log.addHandler(handler)
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, daemon=True, name="metrics-jsonl").start()
+
+    def write(self):
+        self._log.info(json.dumps({"ts": round(time.time(), 3), "metrics": self.registry.snapshot()}))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self._stop.set()
+        self.write()
+
+
+def serve_prometheus(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve the registry as Prometheus text on http://host:port/metrics from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
+
+
+class SamplingProfiler:
+    """
+    Short cProfile captures of the thread that calls tick() (the main loop).
+    A capture starts on request(), on SIGUSR1 where available, when the
+    trigger file appears in the output directory, or every `every` seconds
+    if set; each one runs for `seconds` and is saved as a .prof file.
+    """
+    TRIGGER_FILE = "PROFILE"
+
+    def __init__(self, out_dir=None, seconds=None, every=None):
+        self.out_dir = METRICS["profile_dir"] if out_dir is None else out_dir
+        self.seconds = METRICS["profile_seconds"] if seconds is None else seconds
+        self.every = METRICS["profile_every"] if every is None else every
+        self._requested = threading.Event()
+        self._profile = None
+        self._started_at = 0.0
+        self._last_capture = time.time()
+        self._last_trigger_check = 0.0
+        self.captures = []
+
+    def install_signal(self):
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda *_: self.request())
+
+    def request(self):
+        self._requested.set()
+
+    def _triggered(self, now):
+        if self._requested.is_set():
+            self._requested.clear()
+            return True
+        if self.every and now - self._last_capture >= self.every:
+            return True
+        # Polled at most once a second; lets Windows users trigger a capture without signals
+        if now - self._last_trigger_check >= 1.0:
+            self._last_trigger_check = now
+            trigger = os.path.join(self.out_dir, self.TRIGGER_FILE)
+            if os.path.exists(trigger):
+                try:
+                    os.remove(trigger)
+                except OSError:
+                    pass
+                return True
+        return False
+
+    def tick(self, now=None):
+        now = time.time() if now is None else now
+        if self._profile is not None:
+            if now - self._started_at >= self.seconds:
+                self._finish(now)
+        elif self._triggered(now):
+            self._profile = cProfile.Profile()
+            self._started_at = now
+            self._profile.enable()
+
+    def _finish(self, now):
+        self._profile.disable()
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, time.strftime("profile-%Y%m%d-%H%M%S.prof", time.localtime(now)))
+        self._profile.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(10)
+        print(f"Profile saved to {path}\n{out.getvalue()}")
+        self.captures.append(path)
+        self._profile = None
+        self._last_capture = now
@@ -0,0 +1,79 @@
+import os
+import time
+import cv2
+import numpy as np
+from config.settings import MOTION_GATE
+
+
+class MotionGate:
+    """
+    Decides when continuous detection should run. Each frame is reduced to a
+    tiny grayscale thumbnail and compared with the thumbnail from the last
+    inference: static scenes are skipped, large changes force a run, and the
+    run interval adapts to measured inference time and CPU load.
+    """
+    def __init__(self, min_interval=None, max_interval=None, motion_threshold=None,
+                 scene_change_threshold=None, target_duty=None, thumb_size=(64, 48)):
+        self.min_interval = MOTION_GATE["min_interval"] if min_interval is None else min_interval
+        self.max_interval = MOTION_GATE["max_interval"] if max_interval is None else max_interval
+        self.motion_threshold = MOTION_GATE["motion_threshold"] if motion_threshold is None else motion_threshold
+        self.scene_change_threshold = (MOTION_GATE["scene_change_threshold"]
+                                       if scene_change_threshold is None else scene_change_threshold)
+        self.target_duty = MOTION_GATE["target_duty"] if target_duty is None else target_duty
+        self.thumb_size = thumb_size
+        self.interval = self.min_interval
+        self._reference = None
+        self._last_run = 0.0
+        self._cpu_count = os.cpu_count() or 1
+        self.counters = {"frames": 0, "runs": 0, "forced": 0, "skipped_static": 0, "skipped_rate": 0}
+        self.last_diff = 0.0
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def should_run(self, frame, now=None):
+        now = time.time() if now is None else now
+        self.counters["frames"] += 1
+        thumb = self._thumbnail(frame)
+        if self._reference is None:
+            diff = 255.0
+        else:
+            diff = float(np.abs(thumb - self._reference).mean())
+        self.last_diff = diff
+        elapsed = now - self._last_run
+
+        if diff >= self.scene_change_threshold:
+            self.counters["forced"] += 1
+        elif elapsed >= self.max_interval:
+            # keep-alive so slow drifts are eventually picked up
+            pass
+        elif diff < self.motion_threshold:
+            self.counters["skipped_static"] += 1
+            return False
+        elif elapsed < self.interval:
+            self.counters["skipped_rate"] += 1
+            return False
+
+        self._reference = thumb
+        self._last_run = now
+        self.counters["runs"] += 1
+        return True
+
+    def record_inference(self, seconds):
+        """
+        Feed back how long the detector took. The interval is stretched so
+        detection uses at most `target_duty` of one core, and further when
+        the machine's load average shows little CPU headroom.
+        """
+        interval = seconds / max(self.target_duty, 1e-3)
+        if hasattr(os, "getloadavg"):
+            load = os.getloadavg()[0] / self._cpu_count
+            if load > 0.8:
+                interval *= load / 0.8
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
+
+    def stats(self):
+        return dict(self.counters, interval_s=round(self.interval, 3), last_diff=round(self.last_diff, 2))
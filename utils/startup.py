@@ -0,0 +1,115 @@
+import threading
+import time
+
+
+class Component:
+    __slots__ = ("name", "factory", "after", "value", "error", "started_at", "finished_at", "event", "callbacks")
+
+    def __init__(self, name, factory, after):
+        self.name = name
+        self.factory = factory
+        self.after = tuple(after)
+        self.value = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.event = threading.Event()
+        self.callbacks = []
+
+
+class StartupOrchestrator:
+    """
+    Loads subsystems concurrently, each in its own background thread.
+    A component may wait on others (`after`); its factory then receives the
+    loaded dependencies as keyword arguments. Callers can block on a
+    component with get() or poll it with try_get().
+    """
+    def __init__(self):
+        self._components = {}
+        self._lock = threading.Lock()
+        self._t0 = None
+
+    def add(self, name, factory, after=()):
+        self._components[name] = Component(name, factory, after)
+
+    def start(self, report=True):
+        self._t0 = time.perf_counter()
+        for component in self._components.values():
+            threading.Thread(target=self._load, args=(component,), daemon=True,
+                             name=f"startup-{component.name}").start()
+        if report:
+            threading.Thread(target=self._report_when_done, daemon=True).start()
+
+    def _load(self, component):
+        try:
+            deps = {name: self.get(name) for name in component.after}
+            component.started_at = time.perf_counter()
+            component.value = component.factory(**deps)
+        except Exception as e:
+            component.error = e
+            print(f"Startup: {component.name} failed: {e}")
+        finally:
+            if component.started_at is None:
+                component.started_at = time.perf_counter()
+            component.finished_at = time.perf_counter()
+            with self._lock:
+                component.event.set()
+                callbacks, component.callbacks = component.callbacks, []
+        if component.error is None:
+            for callback in callbacks:
+                try:
+                    callback(component.value)
+                except Exception as e:
+                    print(f"Startup: {component.name} callback failed: {e}")
+
+    def on_ready(self, name, callback):
+        """Run callback(value) once the component has loaded (immediately if it already has)."""
+        component = self._components[name]
+        with self._lock:
+            if not component.event.is_set():
+                component.callbacks.append(callback)
+                return
+        if component.error is None:
+            callback(component.value)
+
+    def ready(self, name):
+        component = self._components[name]
+        return component.event.is_set() and component.error is None
+
+    def error(self, name):
+        """Exception raised while loading the component, or None (loaded or still loading)."""
+        return self._components[name].error
+
+    def try_get(self, name):
+        """Loaded value, or None while still loading (or if loading failed)."""
+        return self._components[name].value if self.ready(name) else None
+
+    def get(self, name, timeout=None):
+        component = self._components[name]
+        if not component.event.wait(timeout):
+            raise TimeoutError(f"{name} is still loading")
+        if component.error is not None:
+            raise RuntimeError(f"{name} failed to load: {component.error}")
+        return component.value
+
+    def report(self):
+        """Per-component load time (excluding dependency waits) and completion offset, in seconds."""
+        rows = []
+        for component in self._components.values():
+            if component.finished_at is None:
+                rows.append({"component": component.name, "status": "loading"})
+                continue
+            rows.append({
+                "component": component.name,
+                "status": "failed" if component.error else "ready",
+                "load_s": round(component.finished_at - component.started_at, 3),
+                "ready_at_s": round(component.finished_at - self._t0, 3),
+            })
+        return rows
+
+    def _report_when_done(self):
+        for component in self._components.values():
+            component.event.wait()
+        print("Startup timing:")
+        for row in sorted(self.report(), key=lambda r: r.get("ready_at_s", 0)):
+            print(f"  {row['component']:<14} {row['status']:<7} load {row['load_s']:>7.3f}s  ready at {row['ready_at_s']:>7.3f}s")
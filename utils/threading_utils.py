@@ -1,22 +1,116 @@
-from queue import Queue
 import threading
+import time
+from collections import deque
 
-commands = Queue()
 
-def listen_thread(mic):
-    while True:
-        cmd = mic.listen()
-        if cmd:
-            commands.put(cmd)
+class Task:
+    __slots__ = ("kind", "fn", "args", "enqueued_at", "deadline")
 
-# Start thread
-threading.Thread(target=listen_thread, args=(mic,), daemon=True).start()
+    def __init__(self, kind, fn, args, deadline):
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.enqueued_at = time.time()
+        self.deadline = deadline
 
-while True:
-    frame = cam.get_frame()
-    if not commands.empty():
-        command = commands.get()
-        if "object" in command:
-            objects = detector.detect(frame)
-            # speak..
+    def expired(self, now=None):
+        return self.deadline is not None and (time.time() if now is None else now) > self.deadline
 
+
+class _Lane:
+    """Bounded pending queue plus counters for one task kind."""
+    def __init__(self, max_queue):
+        self.pending = deque()
+        self.max_queue = max_queue
+        self.running = 0
+        self.waits = deque(maxlen=200)
+        self.counters = {"submitted": 0, "completed": 0, "coalesced": 0, "dropped": 0, "expired": 0, "failed": 0}
+
+
+class TaskScheduler:
+    """
+    Per-kind worker pools with bounded queues, one per kind in a fixed set.
+    Submitting a kind that already has a pending (not yet started) task
+    supersedes it, and tasks whose deadline passed before a worker picked
+    them up are dropped.
+    """
+    def __init__(self, kinds, workers=None, default_workers=1, max_queue=2, coalesce=True):
+        self.workers = dict(workers or {})
+        self.default_workers = default_workers
+        self.max_queue = max_queue
+        self.coalesce = coalesce
+        self._cond = threading.Condition()
+        self._running = True
+        self.rejected = 0
+        # Lanes (and their threads) exist only for the declared kinds, so the
+        # thread count stays fixed whatever strings get submitted
+        self._lanes = {kind: _Lane(max_queue) for kind in kinds}
+        for kind, lane in self._lanes.items():
+            for _ in range(self.workers.get(kind, default_workers)):
+                threading.Thread(target=self._worker, args=(kind, lane), daemon=True).start()
+
+    def submit(self, kind, fn, *args, deadline=None):
+        """
+        Queue fn(*args, deadline=deadline) on the `kind` pool; deadline is an
+        absolute time.time() and is forwarded so fn can drop a late result.
+        Returns the Task, or None for a kind outside the declared set.
+        """
+        task = Task(kind, fn, args, deadline)
+        with self._cond:
+            lane = self._lanes.get(kind)
+            if lane is None:
+                self.rejected += 1
+                return None
+            lane.counters["submitted"] += 1
+            if self.coalesce and lane.pending:
+                lane.counters["coalesced"] += len(lane.pending)
+                lane.pending.clear()
+            elif len(lane.pending) >= lane.max_queue:
+                lane.pending.popleft()
+                lane.counters["dropped"] += 1
+            lane.pending.append(task)
+            self._cond.notify_all()
+        return task
+
+    def _worker(self, kind, lane):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: lane.pending or not self._running)
+                if not self._running:
+                    return
+                task = lane.pending.popleft()
+                now = time.time()
+                lane.waits.append(now - task.enqueued_at)
+                if task.expired(now):
+                    lane.counters["expired"] += 1
+                    continue
+                lane.running += 1
+            try:
+                task.fn(*task.args, deadline=task.deadline)
+                outcome = "completed"
+            except Exception as e:
+                print(f"Task {kind} failed: {e}")
+                outcome = "failed"
+            with self._cond:
+                lane.running -= 1
+                lane.counters[outcome] += 1
+
+    def metrics(self):
+        """Queue depth, in-flight count, counters and wait times (ms) per kind."""
+        with self._cond:
+            report = {"rejected": self.rejected}
+            for kind, lane in self._lanes.items():
+                waits = sorted(lane.waits)
+                report[kind] = dict(lane.counters,
+                                    queue_depth=len(lane.pending),
+                                    running=lane.running,
+                                    wait_p50_ms=round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+                                    wait_max_ms=round(waits[-1] * 1000, 1) if waits else 0.0)
+            return report
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            for lane in self._lanes.values():
+                lane.pending.clear()
+            self._cond.notify_all()